@@ -9,6 +9,12 @@ from .agents import (
     AgentResponse,
     ImageGenerationResult
 )
+from .cache import ResponseCache
+from .checkpoint import MongoCheckpointSaver
+from .mcp_pool import MCPConnectionPool
+from .resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded
+from .telemetry import UsageCallbackHandler
+from .scheduler import LLMScheduler, SchedulerRejected, PRIORITY_STAFF, PRIORITY_PUBLIC, PRIORITY_BATCH
 
 __all__ = [
     "BaseAgent",
@@ -17,5 +23,17 @@ __all__ = [
     "ImageAgent",
     "AgentConfig",
     "AgentResponse",
-    "ImageGenerationResult"
+    "ImageGenerationResult",
+    "ResponseCache",
+    "MongoCheckpointSaver",
+    "MCPConnectionPool",
+    "CircuitBreaker",
+    "CircuitOpen",
+    "DeadlineExceeded",
+    "UsageCallbackHandler",
+    "LLMScheduler",
+    "SchedulerRejected",
+    "PRIORITY_STAFF",
+    "PRIORITY_PUBLIC",
+    "PRIORITY_BATCH"
 ]
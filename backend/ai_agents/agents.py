@@ -1,14 +1,27 @@
 # Extensible AI agents with LangChain and MCP support
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
+import asyncio
 import os
+import time
 import logging
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage, get_buffer_string
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.runnables import RunnableLambda
 from langchain_mcp_adapters.client import MultiServerMCPClient
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
 from pydantic import BaseModel, Field
 
+from .cache import ResponseCache
+from .mcp_pool import MCPConnectionPool
+from .resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, LatencyTracker, remaining
+from .scheduler import LLMScheduler, PRIORITY_BATCH, PRIORITY_PUBLIC, SchedulerRejected
+from .telemetry import UsageCallbackHandler, UsageStats
+
 logger = logging.getLogger(__name__)
 
 
@@ -18,6 +31,8 @@ class AgentConfig:
     api_base_url: str = None
     model_name: str = None
     api_key: str = None
+    # Session history above this many (approximate) tokens is compacted into a summary
+    history_token_budget: int = None
     
     def __post_init__(self):
         # Load from env if not provided
@@ -28,6 +43,8 @@ class AgentConfig:
         if self.api_key is None:
             # LITELLM_AUTH_TOKEN for AI API
             self.api_key = os.getenv("LITELLM_AUTH_TOKEN", "dummy-key")
+        if self.history_token_budget is None:
+            self.history_token_budget = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "4000"))
 
 
 class AgentResponse(BaseModel):
@@ -46,9 +63,91 @@ class ImageGenerationResult(BaseModel):
     success: bool = Field(description="Whether image generation was successful")
 
 
+def _message_text(content: Any) -> str:
+    # Message content is a string or a list of content blocks
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block if isinstance(block, str) else block.get("text", "")
+            for block in content
+            if isinstance(block, (str, dict))
+        )
+    return ""
+
+
+def _preview(value: Any, limit: int = 500) -> str:
+    # Short printable form of a tool input/output for progress events
+    if hasattr(value, "content"):
+        value = value.content
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _cacheable_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    # Per-request accounting must not be replayed from the cache
+    return {k: v for k, v in metadata.items() if k not in ("scheduling", "usage")}
+
+
+# Session state keeps the running summary as its first message, under this id
+SUMMARY_MESSAGE_ID = "conversation-summary"
+
+SUMMARY_PROMPT = """Condense the conversation below into a brief summary for the assistant to continue from.
+Keep facts, names, numbers, decisions and open questions; drop pleasantries.
+If an earlier summary is given, fold it in. Reply with the summary only."""
+
+
+def _split_summary(messages: List[Any]) -> tuple:
+    # (summary text or None, the messages after it)
+    if messages and getattr(messages[0], "id", None) == SUMMARY_MESSAGE_ID:
+        return _message_text(messages[0].content), messages[1:]
+    return None, messages
+
+
+def _answer_dangling_tool_calls(messages: List[Any]) -> tuple:
+    # (messages, whether any were added): a turn cut off between a tool call and its result
+    # (deadline, client disconnect) leaves calls without a ToolMessage, which the model input
+    # check rejects on every later turn; each gets a placeholder result after its AI message
+    answered = {msg.tool_call_id for msg in messages if isinstance(msg, ToolMessage)}
+    repaired: List[Any] = []
+    missing: List[Dict[str, Any]] = []
+    for msg in [*messages, None]:
+        if missing and not isinstance(msg, ToolMessage):
+            repaired.extend(
+                ToolMessage(content="Tool call was interrupted before it returned.", tool_call_id=call["id"], name=call["name"])
+                for call in missing
+            )
+            missing = []
+        if msg is None:
+            break
+        repaired.append(msg)
+        if isinstance(msg, AIMessage):
+            missing = [call for call in msg.tool_calls if call["id"] not in answered]
+    if len(repaired) == len(messages):
+        return messages, False
+    return repaired, True
+
+
+def _current_turn(messages: List[Any]) -> List[Any]:
+    # Messages from the latest human message on: this request's question, tool calls and answer
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
+
+
+def _rejected_response(error: Exception) -> AgentResponse:
+    # A request turned away by the scheduler, the breaker or its deadline, as a failed response
+    reason = "deadline" if isinstance(error, DeadlineExceeded) else getattr(error, "reason", "circuit_open")
+    return AgentResponse(success=False, content="", metadata={"rejected": reason}, error=str(error))
+
+
 class BaseAgent:
     # Base AI agent with LangChain and MCP support
     
+    # Scheduler lane for per-type concurrency caps
+    agent_type = "base"
+    
     def __init__(self, config: AgentConfig, system_prompt: str = "You are a helpful AI assistant."):
         self.config = config
         self.system_prompt = system_prompt
@@ -64,10 +163,60 @@ class BaseAgent:
         self.mcp_client: Optional[MultiServerMCPClient] = None
         self.mcp_tools = []
         
+        # Optional shared MCP pool; when attached, setup_mcp uses its persistent sessions
+        self.mcp_pool: Optional[MCPConnectionPool] = None
+        self._mcp_servers: List[str] = []
+        
+        # Compiled ReAct graph, built on first use and reused until mcp_tools changes
+        self._react_agent = None
+        self._react_agent_tools: tuple = ()
+        
+        # Optional shared response cache; hit/miss counts are per agent
+        self.response_cache: Optional[ResponseCache] = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+        
+        # Optional shared scheduler bounding concurrent LLM work
+        self.scheduler: Optional[LLMScheduler] = None
+        
+        # Optional shared gateway circuit breaker, and hedged retries on the no-tools path
+        self.breaker: Optional[CircuitBreaker] = None
+        self.hedging = False
+        self._llm_latency = LatencyTracker()
+        self._hedges = 0
+        self._hedge_wins = 0
+        
+        # Rolling token usage and latency of upstream executions
+        self._usage = UsageStats()
+        
+        # Optional shared checkpointer; when attached, requests with a session id keep history
+        self.checkpointer: Optional[BaseCheckpointSaver] = None
+        self._session_agents: Dict[bool, tuple] = {}
+        self._session_locks: Dict[str, tuple] = {}
+        self._compactions = 0
+        
+        # Single-flight: identical in-flight requests share one upstream execution
+        # The shared execution gets flight_timeout seconds (unbounded if None), not the leader's
+        # deadline, so a follower with a later deadline isn't failed early; each caller still
+        # stops waiting at its own deadline, and the execution is cancelled when none are left
+        self.flight_timeout: Optional[float] = None
+        self._inflight: Dict[tuple, tuple] = {}
+        self._flights = 0
+        self._coalesced = 0
+        
         logger.info(f"Initialized {self.__class__.__name__} with model {config.model_name}")
     
     async def setup_mcp(self, server_configs: Dict[str, Dict[str, Any]]):
         # Setup MCP servers and load tools
+        if self.mcp_pool is not None:
+            # The pool connects once, keeps the session open and retries with backoff
+            self.mcp_pool.register(server_configs)
+            self._mcp_servers = list(server_configs)
+            self.mcp_client = self.mcp_pool.client
+            self.mcp_tools = await self.mcp_pool.get_tools(self._mcp_servers)
+            logger.info("MCP pool setup complete with %s tools", len(self.mcp_tools))
+            return
+        
         try:
             # Initialize MCP client with server configs (dict of server name -> config)
             logger.debug("Setting up MCP with configs: %s", server_configs)
@@ -101,101 +250,735 @@ class BaseAgent:
             self.mcp_client = None
             self.mcp_tools = []
     
-    async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
+    async def prepare(self):
+        # Hook for one-time async setup (e.g. MCP tool discovery) before the first request
+        pass
+    
+    def _sync_mcp_tools(self):
+        # Pick up the pool's latest catalogue; proxies are stable, so the ReAct graph survives refreshes
+        if self.mcp_pool is not None and self._mcp_servers:
+            self.mcp_tools = self.mcp_pool.current_tools(self._mcp_servers)
+    
+    def _get_react_agent(self):
+        # Compile the LangGraph ReAct agent once per tool set (keyed on tool identity)
+        tools_key = tuple(id(tool) for tool in self.mcp_tools)
+        if self._react_agent is None or tools_key != self._react_agent_tools:
+            from langgraph.prebuilt import create_react_agent
+            
+            logger.info(f"Creating agent with {len(self.mcp_tools)} tools")
+            
+            # Create LangGraph agent with tools (no checkpointer for simplicity)
+            self._react_agent = create_react_agent(
+                self.llm,
+                self.mcp_tools
+            )
+            self._react_agent_tools = tools_key
+        return self._react_agent
+    
+    @classmethod
+    def session_thread_id(cls, session_id: str) -> str:
+        # Checkpointer thread of a session; agent types never share history
+        return f"{cls.agent_type}:{session_id}"
+    
+    def _uses_session(self, session_id: Optional[str]) -> bool:
+        return session_id is not None and self.checkpointer is not None
+    
+    def _get_session_agent(self, use_tools: bool):
+        # ReAct graph that checkpoints each session and compacts its history before every model call
+        tools = self.mcp_tools if use_tools else []
+        tools_key = tuple(id(tool) for tool in tools)
+        cached = self._session_agents.get(use_tools)
+        if cached is None or cached[0] != tools_key:
+            from langgraph.prebuilt import create_react_agent
+            
+            # No prompt=: the hook builds the model input, system prompt and summary included
+            graph = create_react_agent(
+                self.llm,
+                tools,
+                pre_model_hook=self._compact_history,
+                checkpointer=self.checkpointer
+            )
+            cached = self._session_agents[use_tools] = (tools_key, graph)
+        return cached[1]
+    
+    async def _compact_history(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        # Over the token budget, fold the oldest whole turns into the running summary until the
+        # rest fits in half the budget; the current turn is always kept verbatim
+        summary, history = _split_summary(state["messages"])
+        history, rewrite = _answer_dangling_tool_calls(history)
+        update: Dict[str, Any] = {}
+        budget = self.config.history_token_budget
+        if count_tokens_approximately(state["messages"]) > budget:
+            turn_starts = [i for i, msg in enumerate(history) if isinstance(msg, HumanMessage)]
+            current = turn_starts[-1] if turn_starts else 0
+            cut = next(
+                (i for i in turn_starts if count_tokens_approximately(history[i:]) <= budget // 2),
+                current
+            )
+            if cut > 0:
+                older = get_buffer_string(history[:cut])
+                if summary:
+                    older = f"Earlier summary:\n{summary}\n\nConversation:\n{older}"
+                result = await self.llm.ainvoke([SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=older)])
+                summary = _message_text(result.content)
+                history = history[cut:]
+                self._compactions += 1
+                rewrite = True
+        
+        if rewrite:
+            update["messages"] = [
+                RemoveMessage(id=REMOVE_ALL_MESSAGES),
+                *([SystemMessage(content=summary, id=SUMMARY_MESSAGE_ID)] if summary else []),
+                *history
+            ]
+        system_prompt = self.system_prompt
+        if summary:
+            system_prompt += f"\n\nSummary of the conversation so far:\n{summary}"
+        update["llm_input_messages"] = [SystemMessage(content=system_prompt), *history]
+        return update
+    
+    @asynccontextmanager
+    async def _session_turn(self, session_id: str, deadline: Optional[float] = None):
+        # One turn at a time per session, or concurrent turns would fork the history
+        lock, users = self._session_locks.setdefault(session_id, (asyncio.Lock(), [0]))
+        users[0] += 1
+        try:
+            try:
+                await asyncio.wait_for(lock.acquire(), remaining(deadline))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request deadline exceeded waiting for the session")
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            users[0] -= 1
+            if not users[0]:
+                self._session_locks.pop(session_id, None)
+    
+    def _session_metadata(self, messages: List[Any]) -> Dict[str, Any]:
+        summary, history = _split_summary(messages)
+        return {
+            "history_messages": len(history),
+            "history_tokens": count_tokens_approximately(messages),
+            "token_budget": self.config.history_token_budget,
+            "summarised": summary is not None
+        }
+    
+    def _cache_key(self, prompt: str, use_tools: bool) -> str:
+        # The tool set only matters when the ReAct path will run
+        tool_names = (
+            [getattr(tool, "name", "unknown") for tool in self.mcp_tools]
+            if use_tools else []
+        )
+        return ResponseCache.make_key(self.config.model_name, self.system_prompt, prompt, tool_names)
+    
+    def _cache_stats(self, hit: bool) -> Dict[str, Any]:
+        if hit:
+            self._cache_hits += 1
+        else:
+            self._cache_misses += 1
+        lookups = self._cache_hits + self._cache_misses
+        return {
+            "hit": hit,
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "hit_rate": round(self._cache_hits / lookups, 4)
+        }
+    
+    def coalescing_stats(self) -> Dict[str, Any]:
+        requests = self._flights + self._coalesced
+        return {
+            "requests": requests,
+            "executions": self._flights,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._inflight),
+            "dedup_ratio": round(self._coalesced / requests, 4) if requests else 0.0
+        }
+    
+    def _end_flight(self, key: tuple, flight: asyncio.Task):
+        # A cancelled flight is dropped at once, so the key may already belong to a newer one
+        if self._inflight.get(key, (None,))[0] is flight:
+            del self._inflight[key]
+        # Every caller may have timed out already; mark the error as seen so it isn't logged as lost
+        if not flight.cancelled():
+            flight.exception()
+    
+    async def execute(
+        self,
+        prompt: str,
+        use_tools: bool = True,
+        priority: int = PRIORITY_PUBLIC,
+        deadline: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AgentResponse:
+        # A session turn depends on its history, so it is neither coalesced nor cached
+        if self._uses_session(session_id):
+            async with self._session_turn(session_id, deadline):
+                return await self._execute_scheduled(prompt, use_tools, priority, deadline, session_id)
+        
+        # Coalesce concurrent identical requests (whitespace-normalised) into one execution
+        timeout = remaining(deadline)
+        key = (" ".join(prompt.split()), use_tools)
+        leader = key not in self._inflight
+        if leader:
+            self._flights += 1
+            flight_deadline = None if self.flight_timeout is None else time.monotonic() + self.flight_timeout
+            flight = asyncio.ensure_future(self._execute_cached(prompt, use_tools, priority, flight_deadline))
+            callers = {"joined": 0, "waiting": 1}
+            self._inflight[key] = (flight, callers)
+            flight.add_done_callback(lambda task: self._end_flight(key, task))
+        else:
+            self._coalesced += 1
+            flight, callers = self._inflight[key]
+            callers["joined"] += 1
+            callers["waiting"] += 1
+        
+        # Shielded so a caller that disconnects or times out doesn't cancel the execution others
+        # still wait on; once the last caller has gone, nobody needs it and it is cancelled
+        try:
+            response = await asyncio.wait_for(asyncio.shield(flight), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request deadline exceeded")
+        finally:
+            callers["waiting"] -= 1
+            if not callers["waiting"] and not flight.done():
+                # Later identical requests start afresh rather than join a cancelled flight
+                flight.cancel()
+                self._inflight.pop(key, None)
+        response = response.model_copy(deep=True)
+        response.metadata["coalescing"] = {
+            "shared": not leader,
+            "waiters": callers["joined"],
+            **self.coalescing_stats()
+        }
+        return response
+    
+    async def _execute_cached(
+        self,
+        prompt: str,
+        use_tools: bool,
+        priority: int,
+        deadline: Optional[float]
+    ) -> AgentResponse:
+        # Serve identical requests from the response cache when one is attached
+        if self.response_cache is None:
+            return await self._execute_scheduled(prompt, use_tools, priority, deadline)
+        
+        key = self._cache_key(prompt, use_tools)
+        cached = await self.response_cache.aget(key)
+        if cached is not None:
+            content, metadata = cached
+            return AgentResponse(
+                success=True,
+                content=content,
+                metadata={**metadata, "cache": self._cache_stats(True)}
+            )
+        
+        response = await self._execute_scheduled(prompt, use_tools, priority, deadline)
+        if response.success:
+            await self.response_cache.aput(key, response.content, _cacheable_metadata(response.metadata))
+        response.metadata["cache"] = self._cache_stats(False)
+        return response
+    
+    def _scheduling_metadata(self, queue_ms: float, priority: int) -> Dict[str, Any]:
+        stats = self.scheduler.stats()
+        return {
+            "queue_ms": round(queue_ms, 2),
+            "priority": priority,
+            "running": stats["running"],
+            "queued": stats["queued"]
+        }
+    
+    async def _execute_scheduled(
+        self,
+        prompt: str,
+        use_tools: bool,
+        priority: int,
+        deadline: Optional[float],
+        session_id: Optional[str] = None
+    ) -> AgentResponse:
+        # Run upstream inside a scheduler slot, within the deadline and the circuit breaker
+        # SchedulerRejected, CircuitOpen and DeadlineExceeded propagate to the caller
+        # An expired deadline is raised before a half-open probe is claimed, never while holding it
+        timeout = remaining(deadline)
+        probe = self.breaker.before_call() if self.breaker is not None else None
+        
+        if self.scheduler is None:
+            response = await self._execute_guarded(prompt, use_tools, deadline, session_id, probe)
+        else:
+            try:
+                slot = self.scheduler.slot(self.agent_type, priority, timeout=timeout)
+                async with slot as queue_ms:
+                    response = await self._execute_guarded(prompt, use_tools, deadline, session_id, probe)
+            except (SchedulerRejected, asyncio.CancelledError) as e:
+                # Waiting in the queue doesn't say anything about the gateway's health
+                if self.breaker is not None:
+                    self.breaker.record_skipped(probe)
+                if isinstance(e, SchedulerRejected) and deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded("Request deadline exceeded while queued")
+                raise
+            response.metadata["scheduling"] = self._scheduling_metadata(queue_ms, priority)
+        return response
+    
+    async def _execute_guarded(
+        self,
+        prompt: str,
+        use_tools: bool,
+        deadline: Optional[float],
+        session_id: Optional[str] = None,
+        probe: Optional[int] = None
+    ) -> AgentResponse:
+        # Execute within the deadline and report the outcome to the circuit breaker
+        # probe is the breaker's token when this call is the half-open probe
+        try:
+            timeout = remaining(deadline)
+        except DeadlineExceeded:
+            # Ran out while queued; the gateway was never called
+            if self.breaker is not None:
+                self.breaker.record_skipped(probe)
+            raise
+        try:
+            response = await asyncio.wait_for(self._execute(prompt, use_tools, session_id), timeout)
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            if self.breaker is not None:
+                self.breaker.record(False, probe)
+            raise DeadlineExceeded("Request deadline exceeded")
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.record_skipped(probe)
+            raise
+        if self.breaker is not None:
+            self.breaker.record(response.success, probe)
+        return response
+    
+    async def _invoke_llm(self, messages: List[Any], config: Optional[Dict[str, Any]] = None):
+        # Plain LLM call; with hedging on, a duplicate is sent once the first outlives the recent p95
+        started = time.monotonic()
+        delay = self._llm_latency.percentile(0.95) if self.hedging else None
+        if delay is None:
+            response = await self.llm.ainvoke(messages, config=config)
+        else:
+            response = await self._hedged_invoke(messages, delay, config)
+        self._llm_latency.add(time.monotonic() - started)
+        return response
+    
+    async def _hedged_invoke(self, messages: List[Any], delay: float, config: Optional[Dict[str, Any]]):
+        primary = asyncio.ensure_future(self.llm.ainvoke(messages, config=config))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self._hedges += 1
+                tasks.add(asyncio.ensure_future(self.llm.ainvoke(messages, config=config)))
+            # First success wins; fail only when every attempt failed
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedge_wins += 1
+                        return task.result()
+                tasks = pending
+                if not tasks:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    def hedging_stats(self) -> Dict[str, Any]:
+        p95 = self._llm_latency.percentile(0.95)
+        return {
+            "enabled": self.hedging,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedged": self._hedges,
+            "hedge_wins": self._hedge_wins
+        }
+    
+    async def _execute(self, prompt: str, use_tools: bool, session_id: Optional[str] = None) -> AgentResponse:
         # Execute agent with LangGraph
+        usage = UsageCallbackHandler()
+        config = {"callbacks": [usage]}
         try:
             messages = [
                 SystemMessage(content=self.system_prompt),
                 HumanMessage(content=prompt)
             ]
             
+            if self._uses_session(session_id):
+                # The checkpointer restores the history; send only the new question
+                agent = self._get_session_agent(use_tools)
+                config["configurable"] = {"thread_id": self.session_thread_id(session_id)}
+                result = await agent.ainvoke({"messages": [HumanMessage(content=prompt)]}, config=config)
+                response = self._graph_response({"messages": _current_turn(result["messages"])})
+                response.metadata["session"] = self._session_metadata(result["messages"])
             # Use MCP tools with LangGraph if available
-            if use_tools and self.mcp_client and self.mcp_tools:
-                # Use LangGraph's create_react_agent (simple form)
-                from langgraph.prebuilt import create_react_agent
-                
-                logger.info(f"Creating agent with {len(self.mcp_tools)} tools")
-                
-                # Create LangGraph agent with tools (no checkpointer for simplicity)
-                agent = create_react_agent(
-                    self.llm,
-                    self.mcp_tools
-                )
+            elif use_tools and self.mcp_tools:
+                agent = self._get_react_agent()
                 
                 # Execute the agent with system prompt + user message
-                result = await agent.ainvoke({
-                    "messages": [
-                        SystemMessage(content=self.system_prompt),
-                        HumanMessage(content=prompt)
-                    ]
-                })
-                
-                # Extract the final response
-                response_messages = result.get("messages", [])
-                response_content = response_messages[-1].content if response_messages else ""
-                
-                # Check if tools were actually called
-                tools_called = any(
-                    hasattr(msg, "tool_calls") and msg.tool_calls 
-                    for msg in response_messages
+                result = await agent.ainvoke({"messages": messages}, config=config)
+                response = self._graph_response(result)
+            else:
+                # LLM without tools
+                logger.debug(
+                    "No tools available. MCP client: %s, Tools: %s",
+                    self.mcp_client is not None,
+                    len(self.mcp_tools),
                 )
-                
-                # Count tool invocations
-                tool_call_count = sum(
-                    len(msg.tool_calls) if hasattr(msg, "tool_calls") and msg.tool_calls else 0
-                    for msg in response_messages
+                response = self._llm_response(await self._invoke_llm(messages, config))
+            
+        except Exception as e:
+            logger.error(f"Error executing agent: {e}")
+            import traceback
+            traceback.print_exc()
+            response = AgentResponse(
+                success=False,
+                content="",
+                error=str(e)
+            )
+        
+        return self._record_usage(response, usage)
+    
+    def _record_usage(self, response: AgentResponse, usage: UsageCallbackHandler) -> AgentResponse:
+        summary = usage.summary()
+        self._usage.record(summary, response.success)
+        response.metadata["usage"] = summary
+        return response
+    
+    def usage_stats(self) -> Dict[str, Any]:
+        return {**self._usage.stats(), "history_compactions": self._compactions}
+    
+    def _graph_response(self, result: Dict[str, Any]) -> AgentResponse:
+        # Extract the final response
+        response_messages = result.get("messages", [])
+        response_content = response_messages[-1].content if response_messages else ""
+        
+        # Check if tools were actually called
+        tools_called = any(
+            hasattr(msg, "tool_calls") and msg.tool_calls 
+            for msg in response_messages
+        )
+        
+        # Count tool invocations
+        tool_call_count = sum(
+            len(msg.tool_calls) if hasattr(msg, "tool_calls") and msg.tool_calls else 0
+            for msg in response_messages
+        )
+        
+        logger.info(f"Agent executed. Tools called: {tools_called}, Tool call count: {tool_call_count}")
+        logger.debug(f"Response messages: {len(response_messages)}")
+        
+        # Log message types for debugging
+        for i, msg in enumerate(response_messages):
+            logger.debug(f"Message {i}: {type(msg).__name__}, has tool_calls: {hasattr(msg, 'tool_calls')}")
+        
+        return AgentResponse(
+            success=True,
+            content=response_content,
+            metadata={
+                "model": self.config.model_name,
+                "tools_available": len(self.mcp_tools),
+                "tools_used": tools_called,
+                "tool_call_count": tool_call_count,
+                "message_count": len(response_messages)
+            }
+        )
+    
+    def _llm_response(self, response) -> AgentResponse:
+        return AgentResponse(
+            success=True,
+            content=response.content,
+            metadata={
+                "model": self.config.model_name,
+                "tools_available": 0,
+                "tools_used": False
+            }
+        )
+    
+    async def execute_many(
+        self,
+        prompts: List[str],
+        use_tools: bool = True,
+        max_concurrency: int = 8,
+        priority: int = PRIORITY_BATCH,
+        deadline: Optional[float] = None
+    ) -> List[AgentResponse]:
+        # Run independent prompts through abatch; results come back in input order with per-item errors
+        # Repeated prompts in one batch run once, and cached answers skip the LLM entirely
+        await self.prepare()
+        keys = [" ".join(prompt.split()) for prompt in prompts]
+        first_prompt: Dict[str, str] = {}
+        for prompt, key in zip(prompts, keys):
+            first_prompt.setdefault(key, prompt)
+        
+        results: Dict[str, AgentResponse] = {}
+        pending = []
+        for key, prompt in first_prompt.items():
+            cached = await self.response_cache.aget(self._cache_key(prompt, use_tools)) if self.response_cache else None
+            if cached is not None:
+                content, metadata = cached
+                results[key] = AgentResponse(
+                    success=True,
+                    content=content,
+                    metadata={**metadata, "cache": self._cache_stats(True)}
                 )
+            else:
+                pending.append(key)
+        
+        if pending:
+            async def run_one(prompt):
+                # Same path as execute (slot, breaker, hedging); each item takes its own scheduler
+                # slot, so a batch can't starve interactive traffic
+                return await self._execute_scheduled(prompt, use_tools, priority, deadline)
+            
+            outputs = await RunnableLambda(run_one).abatch(
+                [first_prompt[key] for key in pending],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True
+            )
+            
+            for key, output in zip(pending, outputs):
+                if isinstance(output, (SchedulerRejected, CircuitOpen, DeadlineExceeded)):
+                    response = _rejected_response(output)
+                elif isinstance(output, Exception):
+                    logger.error(f"Error executing batch item: {output}")
+                    response = AgentResponse(success=False, content="", error=str(output))
+                else:
+                    response = output
+                    if response.success and self.response_cache is not None:
+                        await self.response_cache.aput(
+                            self._cache_key(first_prompt[key], use_tools),
+                            response.content,
+                            _cacheable_metadata(response.metadata)
+                        )
+                if self.response_cache is not None:
+                    response.metadata["cache"] = self._cache_stats(False)
+                results[key] = response
+        
+        return [results[key].model_copy(deep=True) for key in keys]
+    
+    async def stream(
+        self,
+        prompt: str,
+        use_tools: bool = True,
+        priority: int = PRIORITY_PUBLIC,
+        deadline: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Stream execution as events: token, tool_start, tool_end, then one final done event
+        # The done event's data mirrors AgentResponse; a cache hit arrives as a single token
+        if self._uses_session(session_id):
+            try:
+                async with self._session_turn(session_id, deadline):
+                    async for event in self._stream_scheduled(prompt, use_tools, priority, deadline, session_id):
+                        yield event
+            except DeadlineExceeded as e:
+                yield {"event": "done", "data": _rejected_response(e).model_dump()}
+            return
+        
+        if self.response_cache is None:
+            async for event in self._stream_scheduled(prompt, use_tools, priority, deadline):
+                yield event
+            return
+        
+        key = self._cache_key(prompt, use_tools)
+        cached = await self.response_cache.aget(key)
+        if cached is not None:
+            content, metadata = cached
+            response = AgentResponse(
+                success=True,
+                content=content,
+                metadata={**metadata, "cache": self._cache_stats(True)}
+            )
+            yield {"event": "token", "data": {"content": content}}
+            yield {"event": "done", "data": response.model_dump()}
+            return
+        
+        async for event in self._stream_scheduled(prompt, use_tools, priority, deadline):
+            if event["event"] == "done":
+                data = event["data"]
+                if data["success"]:
+                    await self.response_cache.aput(key, data["content"], _cacheable_metadata(data["metadata"]))
+                data["metadata"]["cache"] = self._cache_stats(False)
+            yield event
+    
+    async def _stream_scheduled(
+        self,
+        prompt: str,
+        use_tools: bool,
+        priority: int,
+        deadline: Optional[float],
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # The slot is held for the whole stream; a rejection or expired deadline arrives as a
+        # failed done event
+        try:
+            timeout = remaining(deadline)
+            probe = self.breaker.before_call() if self.breaker is not None else None
+            if self.scheduler is None:
+                async for event in self._stream_guarded(prompt, use_tools, deadline, session_id, probe):
+                    yield event
+                return
+            
+            try:
+                async with self.scheduler.slot(self.agent_type, priority, timeout=timeout) as queue_ms:
+                    async for event in self._stream_guarded(prompt, use_tools, deadline, session_id, probe):
+                        if event["event"] == "done":
+                            event["data"]["metadata"]["scheduling"] = self._scheduling_metadata(queue_ms, priority)
+                        yield event
+            except (SchedulerRejected, asyncio.CancelledError) as e:
+                if self.breaker is not None:
+                    self.breaker.record_skipped(probe)
+                if isinstance(e, SchedulerRejected) and deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded("Request deadline exceeded while queued")
+                raise
+        except (SchedulerRejected, CircuitOpen, DeadlineExceeded) as e:
+            yield {"event": "done", "data": _rejected_response(e).model_dump()}
+    
+    async def _stream_guarded(
+        self,
+        prompt: str,
+        use_tools: bool,
+        deadline: Optional[float],
+        session_id: Optional[str] = None,
+        probe: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Report the stream's outcome to the circuit breaker; a stream still running at the
+        # deadline is cut off, which counts as a failure
+        # _stream runs in its own task, so cancelling it at the deadline leaves the caller alone
+        finished = False
+        producer = None
+        try:
+            # Ran out while queued; the gateway was never called
+            remaining(deadline)
+            events: asyncio.Queue = asyncio.Queue()
+            
+            async def produce():
+                async for event in self._stream(prompt, use_tools, session_id):
+                    events.put_nowait(event)
+            
+            producer = asyncio.ensure_future(produce())
+            producer.add_done_callback(lambda _: events.put_nowait(None))
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), remaining(deadline))
+                except (asyncio.TimeoutError, DeadlineExceeded):
+                    if self.breaker is not None:
+                        self.breaker.record(False, probe)
+                        finished = True
+                    raise DeadlineExceeded("Request deadline exceeded")
+                if event is None:
+                    # Surfaces anything _stream didn't turn into a done event
+                    await producer
+                    break
+                if event["event"] == "done" and self.breaker is not None:
+                    self.breaker.record(event["data"]["success"], probe)
+                    finished = True
+                yield event
+        finally:
+            if producer is not None and not producer.done():
+                producer.cancel()
+            if not finished and self.breaker is not None:
+                self.breaker.record_skipped(probe)
+    
+    async def _stream(self, prompt: str, use_tools: bool, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        usage = UsageCallbackHandler()
+        config = {"callbacks": [usage]}
+        messages = [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=prompt)
+        ]
+        with_session = self._uses_session(session_id)
+        try:
+            if with_session or (use_tools and self.mcp_tools):
+                if with_session:
+                    agent = self._get_session_agent(use_tools)
+                    config["configurable"] = {"thread_id": self.session_thread_id(session_id)}
+                    messages = [HumanMessage(content=prompt)]
+                else:
+                    agent = self._get_react_agent()
                 
-                logger.info(f"Agent executed. Tools called: {tools_called}, Tool call count: {tool_call_count}")
-                logger.debug(f"Response messages: {len(response_messages)}")
-                
-                # Log message types for debugging
-                for i, msg in enumerate(response_messages):
-                    logger.debug(f"Message {i}: {type(msg).__name__}, has tool_calls: {hasattr(msg, 'tool_calls')}")
+                # Only the last model turn is the answer; earlier turns lead to tool calls
+                response_content = ""
+                turn_streamed = False
+                tool_call_count = 0
+                async for event in agent.astream_events({"messages": messages}, config=config, version="v2"):
+                    kind = event["event"]
+                    if event.get("metadata", {}).get("langgraph_node") == "pre_model_hook":
+                        # History compaction's summary call is not part of the answer
+                        continue
+                    if kind == "on_chat_model_start":
+                        turn_streamed = False
+                    elif kind == "on_chat_model_stream":
+                        text = _message_text(event["data"]["chunk"].content)
+                        if text:
+                            turn_streamed = True
+                            yield {"event": "token", "data": {"content": text}}
+                    elif kind == "on_chat_model_end":
+                        response_content = _message_text(event["data"]["output"].content)
+                        # Models that can't stream only report the whole turn here
+                        if response_content and not turn_streamed:
+                            yield {"event": "token", "data": {"content": response_content}}
+                    elif kind == "on_tool_start":
+                        tool_call_count += 1
+                        yield {
+                            "event": "tool_start",
+                            "data": {"name": event["name"], "input": _preview(event["data"].get("input"))}
+                        }
+                    elif kind == "on_tool_end":
+                        yield {
+                            "event": "tool_end",
+                            "data": {"name": event["name"], "output": _preview(event["data"].get("output"))}
+                        }
                 
-                return AgentResponse(
+                response = AgentResponse(
                     success=True,
                     content=response_content,
                     metadata={
                         "model": self.config.model_name,
                         "tools_available": len(self.mcp_tools),
-                        "tools_used": tools_called,
-                        "tool_call_count": tool_call_count,
-                        "message_count": len(response_messages)
+                        "tools_used": tool_call_count > 0,
+                        "tool_call_count": tool_call_count
                     }
                 )
+                if with_session:
+                    state = await agent.aget_state(config)
+                    response.metadata["session"] = self._session_metadata(state.values["messages"])
             else:
                 # LLM without tools
-                logger.debug(
-                    "No tools available. MCP client: %s, Tools: %s",
-                    self.mcp_client is not None,
-                    len(self.mcp_tools),
-                )
-                response = await self.llm.ainvoke(messages)
-                return AgentResponse(
+                content = []
+                async for chunk in self.llm.astream(messages, config=config):
+                    text = _message_text(chunk.content)
+                    if text:
+                        content.append(text)
+                        yield {"event": "token", "data": {"content": text}}
+                response = AgentResponse(
                     success=True,
-                    content=response.content,
+                    content="".join(content),
                     metadata={
                         "model": self.config.model_name,
                         "tools_available": 0,
                         "tools_used": False
                     }
                 )
-            
         except Exception as e:
-            logger.error(f"Error executing agent: {e}")
-            import traceback
-            traceback.print_exc()
-            return AgentResponse(
+            logger.error(f"Error streaming agent: {e}")
+            response = AgentResponse(
                 success=False,
                 content="",
                 error=str(e)
             )
+        
+        self._record_usage(response, usage)
+        yield {"event": "done", "data": response.model_dump()}
     
     def get_capabilities(self) -> List[str]:
         # Get agent capabilities
         capabilities = ["text_generation", "conversation"]
-        if self.mcp_client:
+        # The pool client always exists, so only tools from connected servers mean MCP is usable
+        self._sync_mcp_tools()
+        if self.mcp_tools:
             capabilities.append("mcp_enabled")
         return capabilities
 
@@ -203,6 +986,8 @@ class BaseAgent:
 class SearchAgent(BaseAgent):
     # Web search and research agent
     
+    agent_type = "search"
+    
     def __init__(self, config: AgentConfig):
         system_prompt = """You are a research assistant with web search capabilities.
 You MUST use the available web search tools to find current and accurate information.
@@ -214,36 +999,68 @@ Cite sources from your search results."""
         
         # Store setup flag
         self._mcp_setup_done = False
+        self._mcp_setup_lock = asyncio.Lock()
     
     async def setup_web_search_mcp(self):
         # Setup web search MCP with auth token
         if self._mcp_setup_done:
+            self._sync_mcp_tools()
             return
+        
+        # Concurrent first requests must not connect to MCP several times
+        async with self._mcp_setup_lock:
+            if self._mcp_setup_done:
+                return
             
-        mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
-        if mcp_token and mcp_token != "dummy-key":
-            server_configs = {
-                "web-search": {
-                    "transport": "streamable_http",
-                    "url": "https://mcp.codexhub.ai/web/mcp",
-                    "headers": {"x-team-key": mcp_token}
+            mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
+            if mcp_token and mcp_token != "dummy-key":
+                server_configs = {
+                    "web-search": {
+                        "transport": "streamable_http",
+                        "url": "https://mcp.codexhub.ai/web/mcp",
+                        "headers": {"x-team-key": mcp_token}
+                    }
                 }
-            }
-            await self.setup_mcp(server_configs)
-            self._mcp_setup_done = True
-            logger.info("Web search MCP configured")
-        else:
-            logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, web search disabled")
+                await self.setup_mcp(server_configs)
+                self._mcp_setup_done = True
+                logger.info("Web search MCP configured")
+            else:
+                logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, web search disabled")
     
-    async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
+    async def prepare(self):
+        await self.setup_web_search_mcp()
+    
+    async def execute(
+        self,
+        prompt: str,
+        use_tools: bool = True,
+        priority: int = PRIORITY_PUBLIC,
+        deadline: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AgentResponse:
         # Ensure MCP is setup before execution
         await self.setup_web_search_mcp()
-        return await super().execute(prompt, use_tools)
+        return await super().execute(prompt, use_tools, priority, deadline, session_id)
+    
+    async def stream(
+        self,
+        prompt: str,
+        use_tools: bool = True,
+        priority: int = PRIORITY_PUBLIC,
+        deadline: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Ensure MCP is setup before streaming
+        await self.setup_web_search_mcp()
+        async for event in super().stream(prompt, use_tools, priority, deadline, session_id):
+            yield event
 
 
 class ChatAgent(BaseAgent):
     # General chat and assistance agent
     
+    agent_type = "chat"
+    
     def __init__(self, config: AgentConfig):
         system_prompt = "Friendly conversational AI. Natural conversations, explanations, analysis. Helpful, harmless, honest."
         
@@ -253,6 +1070,8 @@ class ChatAgent(BaseAgent):
 class ImageAgent(BaseAgent):
     # Image generation agent with MCP support
     
+    agent_type = "image"
+    
     def __init__(self, config: AgentConfig):
         system_prompt = """You are an AI assistant specialized in generating images from text prompts. 
 You MUST use the available image generation tools to create images. 
@@ -264,31 +1083,61 @@ Provide responses in a clear, structured format."""
         
         # Store setup flag
         self._mcp_setup_done = False
+        self._mcp_setup_lock = asyncio.Lock()
     
     async def setup_image_mcp(self):
         # Setup image generation MCP with auth token
         if self._mcp_setup_done:
+            self._sync_mcp_tools()
             return
+        
+        # Concurrent first requests must not connect to MCP several times
+        async with self._mcp_setup_lock:
+            if self._mcp_setup_done:
+                return
             
-        mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
-        if mcp_token and mcp_token != "dummy-key":
-            server_configs = {
-                "image-generation": {
-                    "transport": "streamable_http",
-                    "url": "https://mcp.codexhub.ai/image/mcp",
-                    "headers": {"x-team-key": mcp_token}
+            mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
+            if mcp_token and mcp_token != "dummy-key":
+                server_configs = {
+                    "image-generation": {
+                        "transport": "streamable_http",
+                        "url": "https://mcp.codexhub.ai/image/mcp",
+                        "headers": {"x-team-key": mcp_token}
+                    }
                 }
-            }
-            await self.setup_mcp(server_configs)
-            self._mcp_setup_done = True
-            logger.info("Image generation MCP configured")
-        else:
-            logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, image generation disabled")
+                await self.setup_mcp(server_configs)
+                self._mcp_setup_done = True
+                logger.info("Image generation MCP configured")
+            else:
+                logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, image generation disabled")
+    
+    async def prepare(self):
+        await self.setup_image_mcp()
     
-    async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
+    async def execute(
+        self,
+        prompt: str,
+        use_tools: bool = True,
+        priority: int = PRIORITY_PUBLIC,
+        deadline: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AgentResponse:
         # Ensure MCP is setup before execution
         await self.setup_image_mcp()
-        return await super().execute(prompt, use_tools)
+        return await super().execute(prompt, use_tools, priority, deadline, session_id)
+    
+    async def stream(
+        self,
+        prompt: str,
+        use_tools: bool = True,
+        priority: int = PRIORITY_PUBLIC,
+        deadline: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Ensure MCP is setup before streaming
+        await self.setup_image_mcp()
+        async for event in super().stream(prompt, use_tools, priority, deadline, session_id):
+            yield event
     
     async def generate_image_structured(self, prompt: str) -> ImageGenerationResult:
         # Generate image with structured output
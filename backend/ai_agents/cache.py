@@ -0,0 +1,93 @@
+# Persistent exact-match cache of agent responses
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    # SQLite-backed response cache with TTL and least-recently-used eviction
+    # One connection shared by all agents; calls are serialised by a lock and run off the event loop
+
+    def __init__(self, path: str, ttl_seconds: float = 3600.0, max_entries: int = 5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str, tool_names: List[str]) -> str:
+        # Tool order doesn't change what the agent can do, so it doesn't change the key
+        raw = json.dumps([model, system_prompt, prompt, sorted(tool_names)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            content, metadata, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return content, json.loads(metadata)
+
+    def put(self, key: str, content: str, metadata: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, metadata, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, content, json.dumps(metadata, default=str), now, now)
+            )
+            # Drop expired entries first, then the least recently used beyond the bound
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        try:
+            return await asyncio.to_thread(self.get, key)
+        except sqlite3.Error as e:
+            # A broken cache must never fail the request
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+    async def aput(self, key: str, content: str, metadata: Dict[str, Any]) -> None:
+        try:
+            await asyncio.to_thread(self.put, key, content, metadata)
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
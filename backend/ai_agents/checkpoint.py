@@ -0,0 +1,187 @@
+# LangGraph checkpointer on MongoDB (Motor) for server-side conversation sessions
+
+import random
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from pymongo import DESCENDING, UpdateOne
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    # Async-only saver: one document per checkpoint (channel values inline) plus one per pending write
+    # Only the newest keep_checkpoints checkpoints of a thread are kept; resuming a thread needs just
+    # the latest one, and compaction keeps each checkpoint's message history within the token budget
+    # Documents carry created_at so a TTL index can expire idle sessions
+
+    def __init__(
+        self,
+        db,
+        collection: str = "agent_checkpoints",
+        writes_collection: str = "agent_checkpoint_writes",
+        keep_checkpoints: int = 10
+    ):
+        super().__init__()
+        self.checkpoints = db[collection]
+        self.writes = db[writes_collection]
+        self.keep_checkpoints = max(2, keep_checkpoints)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Same scheme as InMemorySaver: zero-padded counter plus a random tie-breaker
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        query = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", "")
+        }
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query["checkpoint_id"] = checkpoint_id
+        doc = await self.checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        if doc is None:
+            return None
+        return await self._load_tuple(doc)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        query: Dict[str, Any] = {}
+        checkpoint_id: Dict[str, str] = {}
+        if config:
+            query["thread_id"] = config["configurable"]["thread_id"]
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query["checkpoint_ns"] = config["configurable"]["checkpoint_ns"]
+            if get_checkpoint_id(config):
+                checkpoint_id["$eq"] = get_checkpoint_id(config)
+        if before and get_checkpoint_id(before):
+            checkpoint_id["$lt"] = get_checkpoint_id(before)
+        if checkpoint_id:
+            query["checkpoint_id"] = checkpoint_id
+
+        async for doc in self.checkpoints.find(query).sort("checkpoint_id", DESCENDING):
+            if limit is not None and limit <= 0:
+                break
+            # Metadata is stored serialised, so filter after loading, as InMemorySaver does
+            metadata = self.serde.loads_typed((doc["metadata_type"], doc["metadata"]))
+            if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield await self._load_tuple(doc)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        key = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}
+        await self.checkpoints.replace_one(
+            key,
+            {
+                **key,
+                "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                "type": checkpoint_type,
+                "checkpoint": checkpoint_data,
+                "metadata_type": metadata_type,
+                "metadata": metadata_data,
+                "created_at": datetime.now(timezone.utc)
+            },
+            upsert=True
+        )
+        await self._prune(thread_id, checkpoint_ns)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        key = {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+            "checkpoint_id": config["configurable"]["checkpoint_id"]
+        }
+        now = datetime.now(timezone.utc)
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            value_type, value_data = self.serde.dumps_typed(value)
+            fields = {
+                "channel": channel,
+                "type": value_type,
+                "value": value_data,
+                "task_path": task_path,
+                "created_at": now
+            }
+            # Regular writes are kept as first saved; special channels (errors, interrupts) are replaced
+            update = {"$setOnInsert": fields} if idx >= 0 else {"$set": fields}
+            operations.append(UpdateOne({**key, "task_id": task_id, "idx": idx}, update, upsert=True))
+        if operations:
+            await self.writes.bulk_write(operations, ordered=False)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.checkpoints.delete_many({"thread_id": thread_id})
+        await self.writes.delete_many({"thread_id": thread_id})
+
+    async def _prune(self, thread_id: str, checkpoint_ns: str):
+        query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        stale = [
+            doc["checkpoint_id"]
+            async for doc in self.checkpoints.find(query, {"checkpoint_id": 1})
+            .sort("checkpoint_id", DESCENDING)
+            .skip(self.keep_checkpoints)
+        ]
+        if stale:
+            await self.checkpoints.delete_many({**query, "checkpoint_id": {"$in": stale}})
+            await self.writes.delete_many({**query, "checkpoint_id": {"$in": stale}})
+
+    async def _load_tuple(self, doc: Dict[str, Any]) -> CheckpointTuple:
+        key = {
+            "thread_id": doc["thread_id"],
+            "checkpoint_ns": doc["checkpoint_ns"],
+            "checkpoint_id": doc["checkpoint_id"]
+        }
+        writes = [write async for write in self.writes.find(key)]
+        writes.sort(key=lambda write: writes_sort_key(write.get("task_path", ""), write["task_id"], write["idx"]))
+        parent_id = doc.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={"configurable": key},
+            checkpoint=self.serde.loads_typed((doc["type"], doc["checkpoint"])),
+            metadata=self.serde.loads_typed((doc["metadata_type"], doc["metadata"])),
+            parent_config={"configurable": {**key, "checkpoint_id": parent_id}} if parent_id else None,
+            pending_writes=[
+                (write["task_id"], write["channel"], self.serde.loads_typed((write["type"], write["value"])))
+                for write in writes
+            ]
+        )
@@ -0,0 +1,209 @@
+# Shared, long-lived MCP sessions with a cached tool catalogue
+
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the tool latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class ToolLatency:
+    # Latency histogram and error count for one tool
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float, failed: bool = False):
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "histogram_ms": dict(zip(labels, self.buckets))
+        }
+
+
+class _Server:
+    # Connection state for one MCP server, owned by its background task
+
+    def __init__(self, name: str):
+        self.name = name
+        self.task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+        self.broken = asyncio.Event()
+        self.connected = False
+        self.tools: Dict[str, BaseTool] = {}
+        self.proxies: Dict[str, BaseTool] = {}
+        self.refreshed_at = 0.0
+        self.connects = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+
+class MCPConnectionPool:
+    # One persistent session per MCP server, shared by every agent
+    # Each server has an owner task that connects, loads tools, refreshes them every tool_ttl
+    # seconds and reconnects with exponential backoff when the session fails
+    # Agents get stable proxy tools that call through whichever session is current, so a
+    # reconnect or catalogue refresh doesn't force them to rebuild their ReAct graph
+
+    def __init__(
+        self,
+        tool_ttl: float = 300.0,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        connect_timeout: float = 15.0
+    ):
+        self.tool_ttl = tool_ttl
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.client = MultiServerMCPClient({})
+        self._servers: Dict[str, _Server] = {}
+        self._latency: Dict[str, ToolLatency] = {}
+
+    def register(self, server_configs: Dict[str, Dict[str, Any]]):
+        # Add servers (name -> connection config); already registered names are kept as they are
+        for name, connection in server_configs.items():
+            if name not in self._servers:
+                self.client.connections[name] = connection
+                self._servers[name] = _Server(name)
+
+    async def get_tools(self, server_names: List[str]) -> List[BaseTool]:
+        # Connect on first use and wait (bounded) for the first catalogue
+        for name in server_names:
+            server = self._servers[name]
+            if server.task is None:
+                server.task = asyncio.create_task(self._run(server))
+        waits = [self._servers[name].ready.wait() for name in server_names]
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits), self.connect_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"MCP servers {server_names} not ready after {self.connect_timeout}s")
+        return self.current_tools(server_names)
+
+    def current_tools(self, server_names: List[str]) -> List[BaseTool]:
+        # The latest catalogue without waiting; empty for servers that are down
+        return [
+            proxy
+            for name in server_names
+            if self._servers[name].connected
+            for proxy in self._servers[name].proxies.values()
+        ]
+
+    async def _run(self, server: _Server):
+        backoff = self.initial_backoff
+        while True:
+            try:
+                async with self.client.session(server.name) as session:
+                    server.connects += 1
+                    while True:
+                        self._install_tools(server, await load_mcp_tools(session))
+                        server.connected = True
+                        server.ready.set()
+                        backoff = self.initial_backoff
+                        try:
+                            await asyncio.wait_for(server.broken.wait(), self.tool_ttl)
+                        except asyncio.TimeoutError:
+                            continue
+                        raise ConnectionError(server.last_error or "session failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                server.connected = False
+                server.failures += 1
+                server.last_error = str(e)
+                server.broken.clear()
+                server.ready.set()
+                delay = backoff * random.uniform(0.5, 1.0)
+                logger.warning(f"MCP server {server.name} unavailable ({e}); reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _install_tools(self, server: _Server, tools: List[BaseTool]):
+        server.tools = {tool.name: tool for tool in tools}
+        server.refreshed_at = time.time()
+        for name in list(server.proxies):
+            if name not in server.tools:
+                del server.proxies[name]
+        for tool in tools:
+            if tool.name not in server.proxies:
+                server.proxies[tool.name] = self._proxy(server, tool)
+        logger.info(f"MCP server {server.name} catalogue loaded with {len(tools)} tools")
+
+    def _proxy(self, server: _Server, tool: BaseTool) -> BaseTool:
+        latency = self._latency.setdefault(tool.name, ToolLatency())
+
+        async def call(**kwargs):
+            current = server.tools.get(tool.name)
+            if current is None or not server.connected:
+                raise ConnectionError(f"MCP server {server.name} is unavailable")
+            started = time.perf_counter()
+            try:
+                result = await current.coroutine(**kwargs)
+            except ToolException:
+                # The server answered with a tool error; the session itself is fine
+                latency.record((time.perf_counter() - started) * 1000, failed=True)
+                raise
+            except Exception as e:
+                latency.record((time.perf_counter() - started) * 1000, failed=True)
+                # Transport failure: let the owner task reconnect
+                server.last_error = str(e)
+                server.broken.set()
+                raise
+            latency.record((time.perf_counter() - started) * 1000)
+            return result
+
+        return StructuredTool(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            coroutine=call,
+            response_format=tool.response_format,
+            metadata=tool.metadata
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "servers": {
+                name: {
+                    "connected": server.connected,
+                    "tools": sorted(server.tools),
+                    "catalogue_age_seconds": round(now - server.refreshed_at, 1) if server.refreshed_at else None,
+                    "connects": server.connects,
+                    "failures": server.failures,
+                    "last_error": server.last_error
+                }
+                for name, server in self._servers.items()
+            },
+            "tools": {name: latency.stats() for name, latency in self._latency.items()}
+        }
+
+    async def close(self):
+        tasks = [server.task for server in self._servers.values() if server.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
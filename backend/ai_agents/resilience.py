@@ -0,0 +1,126 @@
+# Deadlines, hedging latency tracking and a circuit breaker for the LLM gateway
+
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+    # The request's deadline passed before the agent finished
+    pass
+
+
+class CircuitOpen(Exception):
+    # The gateway is failing; calls are refused until the breaker half-opens
+    def __init__(self, retry_after: int):
+        super().__init__("LLM gateway circuit is open")
+        self.retry_after = retry_after
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    # Seconds left before a time.monotonic() deadline; raises once it has passed
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left
+
+
+class LatencyTracker:
+    # Rolling window of recent call latencies, used to pick the hedging delay
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    # closed: calls flow; failure_threshold consecutive failures open the circuit
+    # open: calls fail fast with CircuitOpen for reset_timeout seconds
+    # half_open: one probe call is let through; success closes, failure re-opens
+    # Outside closed, only the probe's outcome counts: before_call hands the probe a token, and
+    # late results of calls started earlier are ignored, so they can't close or re-time the circuit
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_token = 0
+        self.opened = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+        self.stale = 0
+
+    def before_call(self) -> Optional[int]:
+        # Returns the probe's token when this call is the half-open probe, else None
+        if self.state == "open":
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpen(retry_after=max(1, int(self.reset_timeout - waited)))
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpen(retry_after=1)
+            self._probe_in_flight = True
+            self._probe_token += 1
+            return self._probe_token
+        return None
+
+    def _is_probe(self, token: Optional[int]) -> bool:
+        return self._probe_in_flight and token == self._probe_token
+
+    def record(self, success: bool, token: Optional[int] = None):
+        if self.state != "closed" and not self._is_probe(token):
+            self.stale += 1
+            return
+        self._probe_in_flight = False
+        if success:
+            self.successes += 1
+            self._consecutive_failures = 0
+            self.state = "closed"
+            return
+        self.failures += 1
+        self._consecutive_failures += 1
+        if self.state == "half_open" or self._consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def record_skipped(self, token: Optional[int] = None):
+        # The call never reached the gateway (queued out or cancelled); frees a half-open probe
+        if self._is_probe(token):
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == "open":
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+            "retry_in_seconds": retry_in,
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+            "successes": self.successes,
+            "failures": self.failures,
+            "stale_outcomes": self.stale
+        }
@@ -0,0 +1,137 @@
+# Bounded concurrency scheduler for LLM calls
+
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Lower runs first
+PRIORITY_STAFF = 0
+PRIORITY_PUBLIC = 10
+PRIORITY_BATCH = 20
+
+
+class SchedulerRejected(Exception):
+    # Raised when the wait queue is full or a request waited longer than the queue timeout
+    def __init__(self, reason: str, retry_after: int = 1):
+        super().__init__(f"LLM scheduler rejected request: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    # Caps concurrent LLM work globally and per agent type
+    # Requests over the caps wait in one bounded queue, best priority first, then arrival order
+    # A waiter whose agent type is at its cap doesn't block waiters of other types
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        per_type_limits: Optional[Dict[str, int]] = None,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_type_limits = per_type_limits or {}
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._running: Dict[str, int] = {}
+        self._total_running = 0
+        self._waiting: List[list] = []
+        self._seq = itertools.count()
+        self.granted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_queued = 0
+        self._queue_seconds = 0.0
+
+    def _can_run(self, agent_type: str) -> bool:
+        if self._total_running >= self.max_concurrency:
+            return False
+        limit = self.per_type_limits.get(agent_type)
+        return limit is None or self._running.get(agent_type, 0) < limit
+
+    def _start(self, agent_type: str):
+        self._total_running += 1
+        self._running[agent_type] = self._running.get(agent_type, 0) + 1
+
+    def _release(self, agent_type: str):
+        self._total_running -= 1
+        self._running[agent_type] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        # Hand freed slots to the best runnable waiters
+        for entry in sorted(self._waiting):
+            if self._total_running >= self.max_concurrency:
+                break
+            _, _, agent_type, future = entry
+            if self._can_run(agent_type):
+                self._waiting.remove(entry)
+                self._start(agent_type)
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        agent_type: str,
+        priority: int = PRIORITY_PUBLIC,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[float]:
+        # Hold one concurrency slot for the body; yields the time spent queued in milliseconds
+        # timeout shortens the queue timeout, e.g. to what is left of a request's deadline
+        started = time.perf_counter()
+        if self._can_run(agent_type) and not self._waiting:
+            self._start(agent_type)
+        else:
+            queue_timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+            await self._wait(agent_type, priority, queue_timeout)
+        queue_ms = (time.perf_counter() - started) * 1000
+        self.granted += 1
+        self._queue_seconds += queue_ms / 1000
+        try:
+            yield queue_ms
+        finally:
+            self._release(agent_type)
+
+    async def _wait(self, agent_type: str, priority: int, queue_timeout: float):
+        if len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerRejected("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), agent_type, future]
+        self._waiting.append(entry)
+        self.peak_queued = max(self.peak_queued, len(self._waiting))
+        # Our arrival may be runnable if only lower-priority work was queued
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # Granted just as we gave up; hand the slot straight back
+                self._release(agent_type)
+            else:
+                self._waiting.remove(entry)
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise SchedulerRejected("queue_timeout")
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_type_limits": self.per_type_limits,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "running": self._total_running,
+            "running_by_type": {k: v for k, v in self._running.items() if v},
+            "queued": len(self._waiting),
+            "peak_queued": self.peak_queued,
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_queue_ms": round(self._queue_seconds / self.granted * 1000, 2) if self.granted else 0.0
+        }
@@ -0,0 +1,152 @@
+# Token usage and latency accounting for agent executions
+
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    # Collects one execution's token usage, LLM/tool timings and ReAct iterations
+    # Pass a fresh instance in config={"callbacks": [...]} for every execution
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.first_token_seconds: Optional[float] = None
+        self.tool_seconds: Dict[str, float] = {}
+        self.tool_calls: Dict[str, int] = {}
+        self._llm_started: Dict[UUID, float] = {}
+        self._tool_started: Dict[UUID, tuple] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._llm_started[run_id] = time.monotonic()
+
+    async def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self._llm_started[run_id] = time.monotonic()
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs):
+        if self.first_token_seconds is None and token:
+            self.first_token_seconds = time.monotonic() - self.started
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        now = time.monotonic()
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            self.llm_seconds += now - started
+        self.llm_calls += 1
+        # Without streaming, the first token arrives with the first full response
+        if self.first_token_seconds is None:
+            self.first_token_seconds = now - self.started
+        self._add_usage(response)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        started = self._llm_started.pop(run_id, None)
+        if started is not None:
+            self.llm_seconds += time.monotonic() - started
+
+    async def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tool_started[run_id] = (name, time.monotonic())
+
+    async def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        self._end_tool(run_id)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end_tool(run_id)
+
+    def _end_tool(self, run_id: UUID):
+        started = self._tool_started.pop(run_id, None)
+        if started is not None:
+            name, at = started
+            self.tool_seconds[name] = self.tool_seconds.get(name, 0.0) + time.monotonic() - at
+            self.tool_calls[name] = self.tool_calls.get(name, 0) + 1
+
+    def _add_usage(self, response):
+        # Prefer the message's usage_metadata; fall back to the OpenAI-style llm_output
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    self.completion_tokens += usage.get("output_tokens", 0)
+                    found = True
+        if not found and response.llm_output:
+            usage = response.llm_output.get("token_usage") or {}
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "ttft_ms": round(self.first_token_seconds * 1000, 1) if self.first_token_seconds is not None else None,
+            "llm_ms": round(self.llm_seconds * 1000, 1),
+            "tool_ms": {name: round(seconds * 1000, 1) for name, seconds in self.tool_seconds.items()},
+            "tool_calls": dict(self.tool_calls),
+            "iterations": self.llm_calls,
+            "total_ms": round((time.monotonic() - self.started) * 1000, 1)
+        }
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+class UsageStats:
+    # Rolling window of one agent's execution summaries
+
+    def __init__(self, window: int = 500):
+        self._records = deque(maxlen=window)
+        self.executions = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, summary: Dict[str, Any], success: bool):
+        self._records.append(summary)
+        self.executions += 1
+        self.failures += not success
+        self.prompt_tokens += summary["prompt_tokens"]
+        self.completion_tokens += summary["completion_tokens"]
+
+    def stats(self) -> Dict[str, Any]:
+        records = list(self._records)
+
+        def series(field):
+            return [r[field] for r in records if r[field] is not None]
+
+        tool_ms: Dict[str, List[float]] = {}
+        for r in records:
+            for name, ms in r["tool_ms"].items():
+                tool_ms.setdefault(name, []).append(ms)
+        window = len(records)
+        return {
+            "executions": self.executions,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "window": {
+                "size": window,
+                "avg_prompt_tokens": round(sum(series("prompt_tokens")) / window, 1) if window else 0.0,
+                "avg_completion_tokens": round(sum(series("completion_tokens")) / window, 1) if window else 0.0,
+                "avg_iterations": round(sum(series("iterations")) / window, 2) if window else 0.0,
+                "total_ms": {"p50": _percentile(series("total_ms"), 0.5), "p95": _percentile(series("total_ms"), 0.95)},
+                "ttft_ms": {"p50": _percentile(series("ttft_ms"), 0.5), "p95": _percentile(series("ttft_ms"), 0.95)},
+                "llm_ms": {"p50": _percentile(series("llm_ms"), 0.5), "p95": _percentile(series("llm_ms"), 0.95)},
+                "tool_ms": {
+                    name: {"executions": len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+                    for name, values in tool_ms.items()
+                }
+            }
+        }
@@ -0,0 +1,46 @@
+"""
+Benchmark bcrypt work factors on this machine and recommend one.
+Use the result as BCRYPT_ROUNDS, or set BCRYPT_TARGET_MS to have the
+server calibrate at startup.
+
+Usage: python bcrypt_benchmark.py [--target-ms 250] [--min-rounds 10] [--max-rounds 16] [--samples 3]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from server import BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS, benchmark_bcrypt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bcrypt work factors")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="hash time budget per login")
+    parser.add_argument("--min-rounds", type=int, default=BCRYPT_MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=BCRYPT_MAX_ROUNDS)
+    parser.add_argument("--samples", type=int, default=3, help="hashes timed per work factor")
+    args = parser.parse_args()
+
+    print("\n" + "="*50)
+    print("BCRYPT WORK FACTOR BENCHMARK")
+    print("="*50 + "\n")
+    print(f"  {'rounds':>6}  {'median ms':>10}  {'hashes/s/core':>13}")
+
+    recommended = args.min_rounds
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        ms = benchmark_bcrypt(rounds, args.samples)
+        print(f"  {rounds:>6}  {ms:>10.1f}  {1000 / ms:>13.1f}")
+        if ms > args.target_ms:
+            # Every further round doubles the time
+            break
+        recommended = rounds
+
+    print(f"\n✓ Recommended for a {args.target_ms:.0f}ms target: BCRYPT_ROUNDS={recommended}")
+    print("\n" + "="*50)
+
+
+if __name__ == "__main__":
+    main()
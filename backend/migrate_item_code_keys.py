@@ -0,0 +1,59 @@
+"""
+Migration: backfill item_code_key and create its unique index.
+The server also backfills at startup; run this to see (and fix) duplicate
+item codes that stop the unique index from being created.
+"""
+
+import os
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+from server import backfill_item_code_keys, ensure_indexes, find_duplicate_item_codes
+
+load_dotenv()
+
+
+async def migrate():
+    """Backfill item_code_key, report duplicates and ensure indexes."""
+    mongo_url = os.getenv("MONGO_URL")
+    db_name = os.getenv("DB_NAME")
+
+    if not mongo_url or not db_name:
+        print("Error: MONGO_URL and DB_NAME must be set in .env")
+        sys.exit(1)
+
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+
+    backfilled = await backfill_item_code_keys(db)
+    print(f"✓ Backfilled item_code_key on {backfilled} items")
+
+    duplicates = await find_duplicate_item_codes(db)
+    if duplicates:
+        print(f"✗ {len(duplicates)} item codes are used by more than one item (case-insensitive):")
+        for group in duplicates:
+            print(f"  {group['_id']}: {group['count']} items, ids {', '.join(group['ids'])}")
+        print("\n⚠️  Rename these items, then run this migration again.")
+        client.close()
+        sys.exit(1)
+
+    await ensure_indexes(db)
+    print("✓ Unique item_code_key index in place")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("\n" + "="*50)
+    print("MIGRATE ITEM CODE KEYS")
+    print("="*50 + "\n")
+
+    asyncio.run(migrate())
+
+    print("\n" + "="*50)
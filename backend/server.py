@@ -1,23 +1,43 @@
 """FastAPI server exposing AI agent endpoints."""
 
+import asyncio
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import json
 import logging
 import os
+import re
+import secrets
+import time
 import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Set, Tuple
 
 import bcrypt
 import jwt
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from motor.motor_asyncio import AsyncIOMotorClient
-from pydantic import BaseModel, EmailStr, Field
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 from starlette.middleware.cors import CORSMiddleware
 
-from ai_agents.agents import AgentConfig, ChatAgent, SearchAgent
+from ai_agents.agents import AgentConfig, AgentResponse, ChatAgent, SearchAgent
+from ai_agents.cache import ResponseCache
+from ai_agents.checkpoint import MongoCheckpointSaver
+from ai_agents.mcp_pool import MCPConnectionPool
+from ai_agents.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded
+from ai_agents.scheduler import PRIORITY_BATCH, PRIORITY_PUBLIC, PRIORITY_STAFF, LLMScheduler, SchedulerRejected
 
 
 logging.basicConfig(
@@ -33,8 +53,130 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
+# Listing order shared by catalog, inventory and orders; `id` breaks ties so
+# keyset cursors are stable when several documents share a created_at.
+LISTING_SORT = [("created_at", -1), ("id", -1)]
+
+# Relevance order for text search: best textScore first, newest first on ties
+RELEVANCE_SORT = [("score", {"$meta": "textScore"})] + LISTING_SORT
+ListingSort = Literal["newest", "relevance"]
+
+# Item fields the public catalog filters on
+LISTING_FILTER_FIELDS = frozenset({"status", "category", "metal_type", "price"})
+
+# How listings report their total: exact count, a cheap estimate, or none at all
+CountMode = Literal["exact", "estimated", "none"]
+# "estimated" counts filtered listings only up to this many documents
+ESTIMATED_COUNT_CAP = 10_000
+
+# Reserve stock and insert orders in one multi-document transaction (needs a replica set)
+ORDER_TRANSACTIONS = os.getenv("ORDER_TRANSACTIONS", "false").lower() in ("1", "true", "yes")
+
+# Rows validated and inserted together by the bulk inventory import
+IMPORT_BATCH_SIZE = 500
+# Longest line, or multi-line CSV record, the import buffers before giving up on the upload
+IMPORT_MAX_LINE_BYTES = 1024 * 1024
+
+# Documents fetched per cursor batch, and rows per streamed chunk, by exports
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_ROWS = 200
+
+# Agent request deadline: default, and the most a client may ask for via X-Request-Timeout
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "60"))
+AGENT_MAX_TIMEOUT_SECONDS = float(os.getenv("AGENT_MAX_TIMEOUT_SECONDS", "120"))
+
+# Batch chat: most prompts per request, and the most run at once
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+
+# Chat sessions: idle sessions expire after this long; only the newest checkpoints of each are kept
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+CHAT_SESSION_KEEP_CHECKPOINTS = int(os.getenv("CHAT_SESSION_KEEP_CHECKPOINTS", "10"))
+
+# Startup index self-check: "off", "warn" (log COLLSCANs) or "strict" (refuse to start)
+INDEX_SELF_CHECK = os.getenv("INDEX_SELF_CHECK", "warn").lower()
+
+# Indexes applied idempotently at startup. Listing indexes end in
+# (created_at, id) so that filtered listings are served in sort order.
+INDEX_MANIFEST: Dict[str, List[IndexModel]] = {
+    "jewellery_items": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Case-insensitive item_code uniqueness, enforced by the database
+        IndexModel([("item_code_key", ASCENDING)], unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("metal_type", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("price", ASCENDING)]),
+        # Full-text search over the fields the search box matches; item codes rank highest
+        IndexModel(
+            [("item_code", TEXT), ("name", TEXT), ("description", TEXT)],
+            name="item_search_text",
+            weights={"item_code": 10, "name": 5, "description": 1},
+        ),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("items.item_id", ASCENDING)]),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+    ],
+    "agent_checkpoints": [
+        IndexModel([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=CHAT_SESSION_TTL_SECONDS),
+    ],
+    "agent_checkpoint_writes": [
+        IndexModel(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", ASCENDING),
+             ("task_id", ASCENDING), ("idx", ASCENDING)],
+            unique=True,
+        ),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=CHAT_SESSION_TTL_SECONDS),
+    ],
+    "token_revocations": [
+        IndexModel([("revoked_at", ASCENDING)]),
+        # Dropped once every token the revocation covers has expired
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# Representative hot queries (name, collection, filter, sort) that must not COLLSCAN
+HOT_QUERIES = [
+    ("catalog", "jewellery_items", {"status": "in_stock"}, LISTING_SORT),
+    ("catalog_by_category", "jewellery_items", {"status": "in_stock", "category": "ring"}, LISTING_SORT),
+    ("catalog_by_metal", "jewellery_items", {"status": "in_stock", "metal_type": "gold"}, LISTING_SORT),
+    ("catalog_by_price", "jewellery_items", {"status": "in_stock", "price": {"$gte": 0, "$lte": 100000}}, LISTING_SORT),
+    ("catalog_search", "jewellery_items", {"status": "in_stock", "$text": {"$search": "diamond ring"}}, LISTING_SORT),
+    ("catalog_code_search", "jewellery_items", {"status": "in_stock", "$or": [
+        {"$text": {"$search": '"ring-001"'}}, {"item_code_key": {"$regex": "^ring-001"}}
+    ]}, LISTING_SORT),
+    ("inventory", "jewellery_items", {}, LISTING_SORT),
+    ("inventory_by_category", "jewellery_items", {"category": "ring"}, LISTING_SORT),
+    ("inventory_by_status", "jewellery_items", {"status": "sold"}, LISTING_SORT),
+    ("item_by_id", "jewellery_items", {"id": ""}, None),
+    ("item_by_code", "jewellery_items", {"item_code_key": ""}, None),
+    ("orders", "orders", {}, LISTING_SORT),
+    ("orders_by_status", "orders", {"status": "pending"}, LISTING_SORT),
+    ("order_by_id", "orders", {"id": ""}, None),
+    ("orders_by_item", "orders", {"items.item_id": ""}, None),
+    ("user_by_email", "users", {"email": ""}, None),
+]
+
+# bcrypt work factor: BCRYPT_ROUNDS pins it, BCRYPT_TARGET_MS calibrates it at startup
+BCRYPT_DEFAULT_ROUNDS = 12
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+
 # Security
 security = HTTPBearer()
+# Public endpoints that treat signed-in staff differently
+optional_security = HTTPBearer(auto_error=False)
 
 # Type aliases
 UserRole = Literal["staff", "manager", "owner"]
@@ -42,6 +184,8 @@ MetalType = Literal["gold", "silver", "platinum", "white_gold", "rose_gold"]
 ItemStatus = Literal["in_stock", "sold", "reserved", "discontinued"]
 Category = Literal["ring", "necklace", "bracelet", "earring", "pendant", "bangle", "chain", "other"]
 OrderStatus = Literal["pending", "confirmed", "processing", "shipped", "delivered", "cancelled"]
+ImportFormat = Literal["csv", "ndjson"]
+ExportFormat = Literal["ndjson", "csv"]
 
 
 # Pydantic Models for Jewellery Store
@@ -169,8 +313,10 @@ class OrderStatusUpdate(BaseModel):
 
 class PaginatedResponse(BaseModel):
     page: int
-    total: int
-    total_pages: int
+    # None when the listing was requested with count=none
+    total: Optional[int] = None
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class ItemsResponse(PaginatedResponse):
@@ -181,6 +327,20 @@ class OrdersResponse(PaginatedResponse):
     orders: List[Order]
 
 
+class ImportRowError(BaseModel):
+    row: int  # 1-based line number in the upload
+    item_code: Optional[str] = None
+    code: str
+    message: str
+
+
+class ImportReport(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[ImportRowError]
+
+
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
@@ -195,6 +355,13 @@ class ChatRequest(BaseModel):
     message: str
     agent_type: str = "chat"
     context: Optional[dict] = None
+    # Id of a server-side conversation; omit for a one-off question. Signed-in users may choose
+    # their own, anonymous callers must use one issued by POST /chat/sessions
+    session_id: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9_-]{8,128}$")
+
+
+class ChatSession(BaseModel):
+    session_id: str
 
 
 class ChatResponse(BaseModel):
@@ -206,6 +373,27 @@ class ChatResponse(BaseModel):
     error: Optional[str] = None
 
 
+class ChatBatchRequest(BaseModel):
+    messages: List[str] = Field(..., min_length=1)
+    agent_type: str = "chat"
+    max_concurrency: Optional[int] = Field(None, ge=1)
+
+
+class ChatBatchItem(BaseModel):
+    index: int
+    success: bool
+    response: str
+    metadata: dict = Field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class ChatBatchResponse(BaseModel):
+    agent_type: str
+    succeeded: int
+    failed: int
+    results: List[ChatBatchItem]
+
+
 class SearchRequest(BaseModel):
     query: str
     max_results: int = 5
@@ -220,6 +408,337 @@ class SearchResponse(BaseModel):
     error: Optional[str] = None
 
 
+class CatalogCache:
+    """In-process TTL + LRU cache of rendered public catalog responses.
+
+    Entries are keyed on normalised query params. Each listing entry keeps
+    the filters it was built from and the ids it returned, so a write to
+    one item only drops the entries it could have changed. Responses
+    computed while a write was in flight are not stored (see `generation`).
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # key -> (expires_at, body, item_ids, filters)
+        self._entries: "OrderedDict[Tuple, Tuple[float, bytes, Set[str], Optional[Dict[str, Any]]]]" = OrderedDict()
+
+    def get(self, key: Tuple) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(
+        self,
+        key: Tuple,
+        body: bytes,
+        item_ids: Set[str],
+        filters: Optional[Dict[str, Any]] = None,
+        generation: Optional[int] = None
+    ) -> None:
+        # Skip responses that raced with an invalidation
+        if generation is not None and generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, body, item_ids, filters)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_item(self, item_id: str, *docs: Dict, all_listings: bool = False) -> None:
+        """Drop entries affected by a write to one item.
+
+        `docs` are the item's states around the write (before and/or after);
+        a listing is dropped if it returned the item or its filters match
+        any of those states. `all_listings` drops every listing, for writes
+        whose previous state is unknown.
+        """
+        self.generation += 1
+        stale = [
+            key for key, (_, _, item_ids, filters) in self._entries.items()
+            if key == ("item", item_id) or (
+                filters is not None and (
+                    all_listings
+                    or item_id in item_ids
+                    or any(self._matches(filters, doc) for doc in docs)
+                )
+            )
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    @staticmethod
+    def _matches(filters: Dict[str, Any], doc: Dict) -> bool:
+        if doc.get("status") != "in_stock":
+            return False
+        for field in ("category", "metal_type"):
+            if filters.get(field) and doc.get(field) != filters[field]:
+                return False
+        price = doc.get("price", 0)
+        if filters.get("min_price") is not None and price < filters["min_price"]:
+            return False
+        if filters.get("max_price") is not None and price > filters["max_price"]:
+            return False
+        # Text relevance can't be judged here; any search listing may be affected
+        return True
+
+
+class TokenCache:
+    """Bounded LRU of verified JWT claims, keyed by a digest of the token.
+
+    Entries expire at the token's own `exp`, so a cached token is never
+    accepted longer than `jwt.decode` would accept it. Revocation is
+    checked on every request, cached or not: a deny-list of token digests
+    (logout) and a per-user cut-off that rejects tokens issued at or
+    before it (role changes, sign-out everywhere). Revocations are
+    written to the `token_revocations` collection, which a TTL index
+    empties once the tokens involved have expired, and each process
+    picks up the others' revocations every `sync_seconds`.
+    """
+
+    def __init__(self, max_entries: int = 10_000, sync_seconds: float = 5.0):
+        self.max_entries = max_entries
+        self.sync_seconds = sync_seconds
+        self.hits = 0
+        self.misses = 0
+        # digest -> (claims, exp timestamp)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # digest -> exp timestamp, kept until the token would have expired anyway
+        self._denied: Dict[str, float] = {}
+        # user id -> (cut-off, expiry): tokens issued (iat) at or before the cut-off are revoked,
+        # and once every such token has expired the entry is dropped
+        self._revoked_before: Dict[str, Tuple[float, float]] = {}
+        self._synced_at = float("-inf")
+        self._synced_from: Optional[datetime] = None
+        self._sync_lock = asyncio.Lock()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(digest)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[digest]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, digest: str, claims: Dict[str, Any]) -> None:
+        self._entries[digest] = (claims, float(claims["exp"]))
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def is_revoked(self, digest: str, claims: Dict[str, Any]) -> bool:
+        if digest in self._denied:
+            return True
+        revoked = self._revoked_before.get(claims["sub"])
+        # Tokens minted before iat existed count as issued at epoch
+        return revoked is not None and claims.get("iat", 0) <= revoked[0]
+
+    async def deny(self, db, digest: str, claims: Dict[str, Any]) -> None:
+        """Revoke a single token (logout)."""
+        self._add_denied(digest, float(claims["exp"]))
+        await db.token_revocations.update_one(
+            {"_id": f"token:{digest}"},
+            {"$set": {
+                "digest": digest,
+                "revoked_at": datetime.now(timezone.utc),
+                "expires_at": datetime.fromtimestamp(float(claims["exp"]), timezone.utc)
+            }},
+            upsert=True
+        )
+
+    async def revoke_user(self, db, user_id: str) -> None:
+        """Revoke every token issued to a user so far.
+
+        Tokens carry a sub-second iat, so a re-login right after the
+        revocation gets a token issued after the cut-off.
+        """
+        cutoff = time.time()
+        # No token issued before the cut-off outlives this
+        expires = cutoff + ACCESS_TOKEN_EXPIRE_HOURS * 3600
+        self._add_cutoff(user_id, cutoff, expires)
+        await db.token_revocations.update_one(
+            {"_id": f"user:{user_id}"},
+            {
+                "$set": {
+                    "user_id": user_id,
+                    "revoked_at": datetime.now(timezone.utc),
+                    "expires_at": datetime.fromtimestamp(expires, timezone.utc)
+                },
+                "$max": {"cutoff": cutoff}
+            },
+            upsert=True
+        )
+
+    async def sync(self, db) -> None:
+        """Load revocations made by other processes, at most every sync_seconds."""
+        if time.monotonic() - self._synced_at < self.sync_seconds:
+            return
+        async with self._sync_lock:
+            if time.monotonic() - self._synced_at < self.sync_seconds:
+                return
+            started = datetime.now(timezone.utc)
+            query = {}
+            if self._synced_from is not None:
+                # Overlap the previous sync to allow for clock skew between processes
+                query["revoked_at"] = {"$gte": self._synced_from - timedelta(seconds=60)}
+            try:
+                async for doc in db.token_revocations.find(query):
+                    expires = doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+                    if "digest" in doc:
+                        self._add_denied(doc["digest"], expires)
+                    else:
+                        self._add_cutoff(doc["user_id"], doc["cutoff"], expires)
+            except PyMongoError as exc:
+                # Keep serving from what is already known; retry on the next interval
+                logger.warning("Could not load token revocations: %s", exc)
+            else:
+                self._synced_from = started
+            self._synced_at = time.monotonic()
+            self._prune()
+
+    def _add_denied(self, digest: str, expires: float) -> None:
+        self._denied[digest] = expires
+        self._entries.pop(digest, None)
+
+    def _add_cutoff(self, user_id: str, cutoff: float, expires: float) -> None:
+        current = self._revoked_before.get(user_id)
+        if current is None or cutoff > current[0]:
+            self._revoked_before[user_id] = (cutoff, expires)
+
+    def _prune(self) -> None:
+        now = time.time()
+        self._denied = {key: exp for key, exp in self._denied.items() if exp > now}
+        self._revoked_before = {
+            user_id: revoked for user_id, revoked in self._revoked_before.items() if revoked[1] > now
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "denied_tokens": len(self._denied),
+            "revoked_users": len(self._revoked_before),
+        }
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL, so `max_workers` hashes run in parallel. Once
+    `max_workers` are busy and `max_queue` more are waiting, further calls
+    fail fast with a 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, rounds: int = BCRYPT_DEFAULT_ROUNDS):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.rehashed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_seconds = 0.0
+        self._work_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return bcrypt_cost(hashed) != self.rounds
+
+    async def _run(self, func, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail={"error": {"code": "AUTH_BUSY", "message": "Too many sign-ins in progress, please retry"}},
+                headers={"Retry-After": "1"}
+            )
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        try:
+            result, waited, worked = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.in_flight -= 1
+        # Counters are only touched on the event loop thread
+        self.completed += 1
+        self._wait_seconds += waited
+        self._work_seconds += worked
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": self.rounds,
+            "rehashed": self.rehashed,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait_ms": round(self._wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "avg_hash_ms": round(self._work_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
 # Helper functions
 def _ensure_db(request: Request):
     try:
@@ -228,9 +747,280 @@ def _ensure_db(request: Request):
         raise HTTPException(status_code=503, detail="Database not ready") from exc
 
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def _encode_cursor(doc: Dict) -> str:
+    """Encode the (created_at, id) sort key of a document as an opaque cursor."""
+    payload = json.dumps({"c": doc["created_at"].isoformat(), "i": doc["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by `_encode_cursor` back into its sort key."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["c"]), str(payload["i"])
+    except (ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "INVALID_CURSOR", "message": "Invalid pagination cursor"}}
+        ) from exc
+
+
+def _after_cursor(query: Dict, cursor: str) -> Dict:
+    """Restrict a listing query to documents that sort after the cursor."""
+    created_at, last_id = _decode_cursor(cursor)
+    return _after_sort_key(query, created_at, last_id)
+
+
+def _after_sort_key(query: Dict, created_at: datetime, last_id: str) -> Dict:
+    after = {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": last_id}}
+        ]
+    }
+    return {"$and": [query, after]} if query else after
+
+
+def _text_search(query: Dict, search: Optional[str], sort: ListingSort) -> bool:
+    """Add a full-text clause for `search` to the query.
+
+    A single-word search also matches item codes by prefix, through the
+    item_code_key index, so partial codes keep working. Code-like words
+    (containing digits or separators, e.g. "RING-001") are searched as an
+    exact phrase, or the text index would tokenise them and match every
+    item sharing one part. Returns True when results should be ranked by
+    relevance, which only applies when there is something to rank.
+    """
+    terms = (search or "").replace('"', " ").strip()
+    if not terms:
+        return False
+    words = terms.split()
+    if len(words) > 1:
+        query["$text"] = {"$search": terms}
+        return sort == "relevance"
+
+    code_like = bool(re.search(r"[\d\-_/.]", terms))
+    query["$or"] = [
+        {"$text": {"$search": f'"{terms}"' if code_like else terms}},
+        {"item_code_key": {"$regex": "^" + re.escape(_item_code_key(terms))}},
+    ]
+    return sort == "relevance"
+
+
+def _is_text_query(query: Dict) -> bool:
+    return "$text" in query or any("$text" in clause for clause in query.get("$or", []))
+
+
+async def _count_total(collection, query: Dict, count: CountMode) -> Optional[int]:
+    """Count the documents matching a listing query according to the count mode."""
+    if count == "none":
+        return None
+    if count == "estimated":
+        if not query:
+            # Collection metadata, no scan at all
+            return await collection.estimated_document_count()
+        return await collection.count_documents(query, limit=ESTIMATED_COUNT_CAP)
+    return await collection.count_documents(query)
+
+
+async def _fetch_page(
+    collection,
+    query: Dict,
+    page: int,
+    limit: int,
+    cursor: Optional[str],
+    relevance: bool = False,
+    count: CountMode = "exact"
+) -> Tuple[List[Dict], Optional[str], Optional[int]]:
+    """Fetch one listing page, the cursor of the page after it and the total.
+
+    With a cursor the page is located by a keyset seek on (created_at, id),
+    so deep pages cost the same as the first one. Without a cursor the
+    legacy `page` offset is used. Plain listings read the page in index
+    order and count alongside it from the index alone; a $facet would
+    defeat both, since its sub-pipelines cannot use indexes. Text searches
+    fetch and sort every match whichever way they run, so for them the
+    page and its total come back from one $facet pipeline whose count
+    branch never sorts. Relevance-ranked pages have no stable keyset, so
+    they are paged by offset only.
+
+    The total is None when count="none" (see `_count_total`), so callers
+    must treat total/total_pages as optional.
+    """
+    if relevance and cursor:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "INVALID_CURSOR", "message": "Cursor pagination is not available with sort=relevance"}}
+        )
+
+    sort = dict(RELEVANCE_SORT if relevance else LISTING_SORT)
+    skip = 0 if cursor else (page - 1) * limit
+    # Fetch one extra document to learn whether another page exists
+    fetch = limit + 1
+    page_stages = ([{"$skip": skip}] if skip else []) + [{"$limit": fetch}]
+
+    if count == "exact" or (count == "estimated" and query):
+        count_stages = [{"$count": "n"}]
+        if count == "estimated":
+            count_stages.insert(0, {"$limit": ESTIMATED_COUNT_CAP})
+    else:
+        count_stages = None
+
+    if not cursor and count_stages and (relevance or _is_text_query(query)):
+        # Inside $facet the text score is only reachable as a field
+        pre_facet = [{"$set": {"_relevance": {"$meta": "textScore"}}}] if relevance else []
+        facet_sort = {"_relevance": -1, **dict(LISTING_SORT)} if relevance else sort
+        items_stages = [{"$sort": facet_sort}] + page_stages + ([{"$unset": "_relevance"}] if relevance else [])
+        pipeline = [
+            {"$match": query},
+            *pre_facet,
+            {"$facet": {"items": items_stages, "total": count_stages}}
+        ]
+        facet = (await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=1))[0]
+        docs = facet["items"]
+        total = facet["total"][0]["n"] if facet["total"] else 0
+    else:
+        # Index-ordered page; the count (if any) runs alongside it
+        page_query = _after_cursor(query, cursor) if cursor else query
+        pipeline = [{"$match": page_query}, {"$sort": sort}] + page_stages
+        docs, total = await asyncio.gather(
+            collection.aggregate(pipeline, allowDiskUse=True).to_list(length=fetch),
+            _count_total(collection, query, count)
+        )
+
+    next_cursor = None
+    if len(docs) > limit and not relevance:
+        next_cursor = _encode_cursor(docs[limit - 1])
+    return docs[:limit], next_cursor, total
+
+
+async def _check_item_code_free(request: Request, db, item_code_key: str, item_id: Optional[str] = None) -> None:
+    """Reject an item code already in use, when the unique index isn't there to do it.
+
+    Racy, unlike the index, so only a stopgap until the index can be built.
+    """
+    if getattr(request.app.state, "item_codes_unique", True):
+        return
+    query: Dict[str, Any] = {"item_code_key": item_code_key}
+    if item_id is not None:
+        query["id"] = {"$ne": item_id}
+    if await db.jewellery_items.find_one(query, {"_id": 1}):
+        raise HTTPException(
+            status_code=409,
+            detail={"error": {"code": "DUPLICATE_ITEM_CODE", "message": "Item code already exists"}}
+        )
+
+
+async def _fetch_items_by_id(db, item_ids) -> Dict[str, Dict]:
+    items_cursor = db.jewellery_items.find({"id": {"$in": list(item_ids)}})
+    return {item["id"]: item for item in await items_cursor.to_list(length=len(item_ids))}
+
+
+def _price_order_lines(
+    order_data: OrderCreate,
+    items_by_id: Dict[str, Dict],
+    requested: Dict[str, int]
+) -> Tuple[List[OrderItem], int]:
+    """Validate order lines against current item state and price them."""
+    order_items = []
+    total_amount = 0
+
+    for item_input in order_data.items:
+        item = items_by_id.get(item_input.item_id)
+
+        if not item:
+            raise HTTPException(
+                status_code=404,
+                detail={"error": {"code": "NOT_FOUND", "message": f"Item {item_input.item_id} not found"}}
+            )
+
+        if item["status"] != "in_stock":
+            raise HTTPException(
+                status_code=400,
+                detail={"error": {"code": "ITEM_NOT_AVAILABLE", "message": f"Item {item['item_code']} is not available"}}
+            )
+
+        # Lines repeating an item draw on the same stock
+        if item["quantity"] < requested[item["id"]]:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": {"code": "INSUFFICIENT_STOCK", "message": f"Insufficient stock for item {item['item_code']}"}}
+            )
+
+        subtotal = item["price"] * item_input.quantity
+        order_items.append(OrderItem(
+            item_id=item["id"],
+            item_code=item["item_code"],
+            name=item["name"],
+            price=item["price"],
+            quantity=item_input.quantity,
+            subtotal=subtotal
+        ))
+        total_amount += subtotal
+
+    return order_items, total_amount
+
+
+async def _reserve_stock(db, requested: Dict[str, int], session=None) -> bool:
+    """Atomically take `requested` quantities out of stock, all or nothing.
+
+    Each decrement only applies while the item is in stock with enough
+    quantity left, so concurrent checkouts can never drive it negative.
+    Inside a transaction a short bulk write is left for the caller to
+    abort; otherwise the lines that did apply are given back.
+    """
+    now = datetime.now(timezone.utc)
+    updates = [
+        (
+            {"id": item_id, "status": "in_stock", "quantity": {"$gte": quantity}},
+            {"$inc": {"quantity": -quantity}, "$set": {"updated_at": now}}
+        )
+        for item_id, quantity in requested.items()
+    ]
+
+    if session is not None:
+        result = await db.jewellery_items.bulk_write(
+            [UpdateOne(query, update) for query, update in updates], ordered=False, session=session
+        )
+        return result.modified_count == len(updates)
+
+    # One conditional write per line, all in flight at once, so each line's outcome is known
+    results = await asyncio.gather(
+        *(db.jewellery_items.update_one(query, update) for query, update in updates),
+        return_exceptions=True
+    )
+    reserved = {
+        item_id: quantity
+        for (item_id, quantity), result in zip(requested.items(), results)
+        if not isinstance(result, BaseException) and result.modified_count == 1
+    }
+    if len(reserved) == len(requested):
+        return True
+
+    if reserved:
+        await _release_stock(db, reserved)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return False
+
+
+async def _release_stock(db, quantities: Dict[str, int]) -> None:
+    """Give back stock taken by `_reserve_stock`."""
+    now = datetime.now(timezone.utc)
+    await db.jewellery_items.bulk_write(
+        [
+            UpdateOne({"id": item_id}, {"$inc": {"quantity": quantity}, "$set": {"updated_at": now}})
+            for item_id, quantity in quantities.items()
+        ],
+        ordered=False
+    )
+
+
+def hash_password(password: str, rounds: int = BCRYPT_DEFAULT_ROUNDS) -> str:
+    """Hash a password using bcrypt with the given work factor."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
 
 
 def verify_password(password: str, hashed: str) -> bool:
@@ -238,47 +1028,113 @@ def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
 
+def bcrypt_cost(hashed: str) -> int:
+    """Read the work factor from a bcrypt hash ("$2b$12$...")."""
+    return int(hashed.split("$")[2])
+
+
+def benchmark_bcrypt(rounds: int, samples: int = 3) -> float:
+    """Median milliseconds to hash a password at the given work factor."""
+    salt = bcrypt.gensalt(rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", salt)
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS,
+    samples: int = 3
+) -> int:
+    """Pick the highest work factor whose hash time stays within target_ms.
+
+    Each extra round doubles the cost, so the search stops at the first
+    factor over the target. Never goes below min_rounds.
+    """
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        if benchmark_bcrypt(rounds, samples) > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+
 def create_access_token(user_id: str, email: str, role: UserRole) -> str:
     """Create a JWT access token."""
-    expire = datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     to_encode = {
         "sub": user_id,
         "email": email,
         "role": role,
-        "exp": expire
+        # Sub-second, so a token issued right after a revocation cut-off is told apart from one before it
+        "iat": now.timestamp(),
+        "exp": expire,
+        # Unique per token, so logging out one session never revokes a twin
+        "jti": uuid.uuid4().hex
     }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    request: Request = None
-) -> Dict:
-    """Decode JWT and return current user info."""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        email = payload.get("email")
-        role = payload.get("role")
+def _verify_token(token: str, token_cache: TokenCache) -> Tuple[str, Dict]:
+    """Return the token's digest and verified claims, from cache when possible."""
+    digest = TokenCache.digest(token)
+    payload = token_cache.get(digest)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(
+                status_code=401,
+                detail={"error": {"code": "INVALID_TOKEN", "message": "Token expired"}}
+            )
+        except jwt.InvalidTokenError:
+            raise HTTPException(
+                status_code=401,
+                detail={"error": {"code": "INVALID_TOKEN", "message": "Invalid token"}}
+            )
 
-        if not user_id or not email or not role:
+        if not payload.get("sub") or not payload.get("email") or not payload.get("role"):
             raise HTTPException(
                 status_code=401,
                 detail={"error": {"code": "INVALID_TOKEN", "message": "Invalid token"}}
             )
+        token_cache.put(digest, payload)
 
-        return {"id": user_id, "email": email, "role": role}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=401,
-            detail={"error": {"code": "INVALID_TOKEN", "message": "Token expired"}}
-        )
-    except jwt.InvalidTokenError:
+    if token_cache.is_revoked(digest, payload):
         raise HTTPException(
             status_code=401,
-            detail={"error": {"code": "INVALID_TOKEN", "message": "Invalid token"}}
+            detail={"error": {"code": "INVALID_TOKEN", "message": "Token revoked"}}
         )
+    return digest, payload
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    request: Request = None
+) -> Dict:
+    """Verify JWT (cached) and return current user info."""
+    _, payload = _verify_token(credentials.credentials, await _synced_token_cache(request))
+    return {"id": payload["sub"], "email": payload["email"], "role": payload["role"]}
+
+
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    request: Request = None
+) -> Optional[Dict]:
+    """Current user if a valid bearer token was sent, else None (never raises)."""
+    if credentials is None:
+        return None
+    token_cache = await _synced_token_cache(request)
+    try:
+        _, payload = _verify_token(credentials.credentials, token_cache)
+    except HTTPException:
+        return None
+    return {"id": payload["sub"], "email": payload["email"], "role": payload["role"]}
 
 
 def require_role(allowed_roles: List[UserRole]):
@@ -293,27 +1149,549 @@ def require_role(allowed_roles: List[UserRole]):
     return role_checker
 
 
+def _item_code_key(item_code: str) -> str:
+    """Normalised item_code used for case-insensitive uniqueness.
+
+    Matches the `$toLower` used by `backfill_item_code_keys`.
+    """
+    return item_code.lower()
+
+
+async def backfill_item_code_keys(db) -> int:
+    """Set item_code_key on items stored before it existed; returns the number updated."""
+    result = await db.jewellery_items.update_many(
+        {"item_code_key": {"$exists": False}},
+        [{"$set": {"item_code_key": {"$toLower": "$item_code"}}}]
+    )
+    return result.modified_count
+
+
+async def find_duplicate_item_codes(db) -> List[Dict]:
+    """List item_code_key groups held by more than one item (these block the unique index)."""
+    pipeline = [
+        {"$group": {"_id": "$item_code_key", "count": {"$sum": 1}, "ids": {"$push": "$id"}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    return await db.jewellery_items.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+
+async def ensure_indexes(db) -> None:
+    """Create every index in INDEX_MANIFEST (no-op for existing ones).
+
+    Indexes are created one at a time: a single failure (e.g. duplicates
+    blocking a unique index) must not keep the others from being built.
+    """
+    for collection_name, indexes in INDEX_MANIFEST.items():
+        created = []
+        for index in indexes:
+            try:
+                created.extend(await db[collection_name].create_indexes([index]))
+            except OperationFailure as exc:
+                # The self-check reports the fallout
+                logger.error("Failed to create index %s on %s: %s", index.document["name"], collection_name, exc)
+        logger.info("Indexes ensured on %s: %s", collection_name, ", ".join(created))
+
+
+def _plan_stages(node) -> List[str]:
+    """Collect every stage name in an explain() plan tree."""
+    if isinstance(node, list):
+        return [stage for child in node for stage in _plan_stages(child)]
+    if not isinstance(node, dict):
+        return []
+    stages = [node["stage"]] if isinstance(node.get("stage"), str) else []
+    for value in node.values():
+        if isinstance(value, (dict, list)):
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def verify_query_plans(db) -> List[str]:
+    """Explain every hot query and return the names of those planned as a COLLSCAN."""
+    collscans = []
+    for name, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = await cursor.explain()
+        winning_plan = plan.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append(name)
+    return collscans
+
+
+async def item_codes_unique(db) -> bool:
+    """Whether the unique item_code_key index is in place.
+
+    Legacy duplicate item codes stop it from being built; until
+    migrate_item_code_keys.py has resolved them, writes check item codes
+    themselves (see `_check_item_code_free`).
+    """
+    indexes = await db.jewellery_items.index_information()
+    unique = any(
+        spec.get("unique") and [field for field, _ in spec["key"]] == ["item_code_key"]
+        for spec in indexes.values()
+    )
+    if not unique:
+        logger.error(
+            "Unique item_code_key index is missing, probably because of duplicate item codes; "
+            "run migrate_item_code_keys.py. Item codes are checked before each write until then."
+        )
+    return unique
+
+
+async def _provision_indexes(db) -> None:
+    backfilled = await backfill_item_code_keys(db)
+    if backfilled:
+        logger.info("Backfilled item_code_key on %s items", backfilled)
+    await ensure_indexes(db)
+    if INDEX_SELF_CHECK == "off":
+        return
+
+    collscans = await verify_query_plans(db)
+    if not collscans:
+        logger.info("Index self-check passed for %s hot queries", len(HOT_QUERIES))
+        return
+
+    message = f"Hot queries planned as COLLSCAN: {', '.join(collscans)}"
+    if INDEX_SELF_CHECK == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
+
+
+class ImportStopped(Exception):
+    """The upload cannot be read past this line; rows before it are still imported."""
+
+    def __init__(self, row: int, code: str, message: str):
+        super().__init__(message)
+        self.error = ImportRowError(row=row, code=code, message=message)
+
+
+def _decode_upload_line(line: bytes, line_number: int) -> str:
+    try:
+        return line.decode("utf-8-sig" if line_number == 1 else "utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        raise ImportStopped(line_number, "INVALID_ENCODING", "Line is not valid UTF-8")
+
+
+async def _iter_upload_lines(request: Request) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (line number, line) pairs from the request body as it streams in."""
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, _decode_upload_line(line, line_number)
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            raise ImportStopped(line_number + 1, "LINE_TOO_LONG", f"Line is longer than {IMPORT_MAX_LINE_BYTES} bytes")
+    if buffer:
+        yield line_number + 1, _decode_upload_line(buffer, line_number + 1)
+
+
+class _NeedMoreLines(Exception):
+    pass
+
+
+class _CsvLines:
+    # Line source for the one csv.reader over an upload. When the reader runs dry part-way
+    # through a quoted multi-line field, rewind() puts the record's lines back so it can be
+    # re-read once more of the body has arrived
+    def __init__(self):
+        self.pending: deque = deque()
+        self.record: List[Tuple[int, str]] = []
+        self.record_bytes = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.pending:
+            if self.closed:
+                raise StopIteration
+            raise _NeedMoreLines
+        line_number, line = self.pending.popleft()
+        self.record.append((line_number, line))
+        self.record_bytes += len(line)
+        if self.record_bytes > IMPORT_MAX_LINE_BYTES:
+            raise ImportStopped(self.record[0][0], "LINE_TOO_LONG", f"Record is longer than {IMPORT_MAX_LINE_BYTES} bytes")
+        return line
+
+    def rewind(self):
+        self.pending.extendleft(reversed(self.record))
+        self.take()
+
+    def take(self) -> int:
+        """Finish the current record; returns the line it started on."""
+        line_number = self.record[0][0] if self.record else 0
+        self.record = []
+        self.record_bytes = 0
+        return line_number
+
+
+def _read_csv_records(reader, lines: _CsvLines) -> List[Tuple[int, object]]:
+    """Parse every complete record buffered so far; unparseable ones come back as messages."""
+    records = []
+    while True:
+        try:
+            values = next(reader)
+        except _NeedMoreLines:
+            lines.rewind()
+            return records
+        except StopIteration:
+            return records
+        except csv.Error as exc:
+            values = f"Invalid CSV: {exc}"
+        records.append((lines.take(), values))
+
+
+async def _iter_import_rows(request: Request, import_format: ImportFormat) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, row dict) per record; unparseable records yield their error message."""
+    csv_lines = _CsvLines()
+    # One reader for the whole upload so quoted fields may span lines
+    reader = csv.reader(csv_lines)
+    header = None
+
+    def csv_rows():
+        nonlocal header
+        for line_number, values in _read_csv_records(reader, csv_lines):
+            if isinstance(values, str):
+                yield line_number, values
+                continue
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            # Empty cells fall back to model defaults; images are "|"-separated
+            row = {name: value for name, value in zip(header, values) if value != ""}
+            if "images" in row:
+                row["images"] = [url.strip() for url in row["images"].split("|") if url.strip()]
+            yield line_number, row
+
+    async for line_number, line in _iter_upload_lines(request):
+        if import_format == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as exc:
+                yield line_number, f"Invalid JSON: {exc}"
+            continue
+
+        # Keep the line break so it survives inside multi-line quoted fields
+        csv_lines.pending.append((line_number, line + "\n"))
+        for row in csv_rows():
+            yield row
+
+    if import_format == "csv":
+        csv_lines.closed = True
+        for row in csv_rows():
+            yield row
+
+
+async def _import_batch(db, batch: List[Tuple[int, object]], seen_keys: Set[str], errors: List[ImportRowError]) -> int:
+    """Validate and insert one batch of import rows; returns the number inserted."""
+    docs = []
+    rows = []
+    for line_number, raw in batch:
+        if not isinstance(raw, dict):
+            message = raw if isinstance(raw, str) else "Row must be a JSON object"
+            errors.append(ImportRowError(row=line_number, code="INVALID_ROW", message=message))
+            continue
+        try:
+            item = JewelleryItem(**JewelleryItemCreate.model_validate(raw).model_dump())
+        except ValidationError as exc:
+            item_code = raw.get("item_code")
+            message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in exc.errors())
+            errors.append(ImportRowError(
+                row=line_number, item_code=str(item_code) if item_code is not None else None,
+                code="VALIDATION_ERROR", message=message
+            ))
+            continue
+
+        key = _item_code_key(item.item_code)
+        if key in seen_keys:
+            errors.append(ImportRowError(
+                row=line_number, item_code=item.item_code, code="DUPLICATE_ITEM_CODE",
+                message="Item code repeated earlier in the import"
+            ))
+            continue
+        seen_keys.add(key)
+        doc = item.model_dump()
+        doc["item_code_key"] = key
+        docs.append(doc)
+        rows.append(line_number)
+
+    if not docs:
+        return 0
+
+    # One indexed $in lookup for the batch's codes that already exist
+    existing_cursor = db.jewellery_items.find(
+        {"item_code_key": {"$in": [doc["item_code_key"] for doc in docs]}}, {"_id": 0, "item_code_key": 1}
+    )
+    existing = {doc["item_code_key"] for doc in await existing_cursor.to_list(length=len(docs))}
+    new_docs = []
+    new_rows = []
+    for line_number, doc in zip(rows, docs):
+        if doc["item_code_key"] in existing:
+            errors.append(ImportRowError(
+                row=line_number, item_code=doc["item_code"], code="DUPLICATE_ITEM_CODE",
+                message="Item code already exists"
+            ))
+        else:
+            new_docs.append(doc)
+            new_rows.append(line_number)
+
+    if not new_docs:
+        return 0
+    try:
+        await db.jewellery_items.insert_many(new_docs, ordered=False)
+    except BulkWriteError as exc:
+        # Codes created concurrently since the lookup; everything else went in
+        write_errors = exc.details.get("writeErrors", [])
+        for write_error in write_errors:
+            doc = new_docs[write_error["index"]]
+            duplicate = write_error.get("code") == 11000
+            errors.append(ImportRowError(
+                row=new_rows[write_error["index"]],
+                item_code=doc["item_code"],
+                code="DUPLICATE_ITEM_CODE" if duplicate else "WRITE_ERROR",
+                message="Item code already exists" if duplicate else write_error.get("errmsg", "Write failed")
+            ))
+        return len(new_docs) - len(write_errors)
+    return len(new_docs)
+
+
+def _parse_date(value: str, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "INVALID_DATE", "message": f"{name} must be an ISO 8601 date"}}
+        ) from exc
+
+
+def _export_query(query: Dict, from_date: Optional[str], to_date: Optional[str], cursor: Optional[str]) -> Dict:
+    """Add the export date range and resume point to a filter query."""
+    if from_date:
+        query.setdefault("created_at", {})["$gte"] = _parse_date(from_date, "from_date")
+    if to_date:
+        query.setdefault("created_at", {})["$lte"] = _parse_date(to_date, "to_date")
+    if cursor:
+        # Resume right after the last row the client received, even if it has since been deleted
+        query = _after_cursor(query, cursor)
+    return query
+
+
+def _csv_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        # Same "|"-separated form the CSV import reads
+        return "|".join(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(",", ":"))
+    return str(value)
+
+
+async def _stream_export(collection, query: Dict, model, export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Stream every matching document, newest first, as NDJSON or CSV chunks.
+
+    Documents come straight off a Mongo cursor and are flushed every
+    EXPORT_CHUNK_ROWS rows, so memory stays flat however large the export.
+    Every row carries the listing cursor (see `_encode_cursor`) that
+    resumes the export after it.
+    """
+    columns = list(model.model_fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(columns + ["cursor"])
+
+    rows = 0
+    cursor = collection.find(query).sort(LISTING_SORT).batch_size(EXPORT_BATCH_SIZE)
+    async for doc in cursor:
+        record = model(**doc).model_dump(mode="json")
+        record["cursor"] = _encode_cursor(doc)
+        if export_format == "csv":
+            writer.writerow([_csv_cell(record[column]) for column in columns + ["cursor"]])
+        else:
+            buffer.write(json.dumps(record, separators=(",", ":")))
+            buffer.write("\n")
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _export_response(chunks: AsyncIterator[bytes], name: str, export_format: ExportFormat) -> StreamingResponse:
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    )
+
+
+def _get_token_cache(request: Request) -> TokenCache:
+    if not hasattr(request.app.state, "token_cache"):
+        request.app.state.token_cache = TokenCache()
+    return request.app.state.token_cache
+
+
+async def _synced_token_cache(request: Request) -> TokenCache:
+    """The token cache, with other processes' revocations loaded when due."""
+    token_cache = _get_token_cache(request)
+    db = getattr(request.app.state, "db", None)
+    if db is not None:
+        await token_cache.sync(db)
+    return token_cache
+
+
+def _get_password_hasher(request: Request) -> PasswordHasher:
+    if not hasattr(request.app.state, "password_hasher"):
+        request.app.state.password_hasher = PasswordHasher()
+    return request.app.state.password_hasher
+
+
+def _get_catalog_cache(request: Request) -> CatalogCache:
+    if not hasattr(request.app.state, "catalog_cache"):
+        request.app.state.catalog_cache = CatalogCache()
+    return request.app.state.catalog_cache
+
+
 def _get_agent_cache(request: Request) -> Dict[str, object]:
     if not hasattr(request.app.state, "agent_cache"):
         request.app.state.agent_cache = {}
     return request.app.state.agent_cache
 
 
+AGENT_TYPES = {"search": SearchAgent, "chat": ChatAgent}
+
+
 async def _get_or_create_agent(request: Request, agent_type: str):
     cache = _get_agent_cache(request)
     if agent_type in cache:
         return cache[agent_type]
+    if agent_type not in AGENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown agent type '{agent_type}'")
+    return await _create_agent(request.app, agent_type)
 
-    config: AgentConfig = request.app.state.agent_config
 
-    if agent_type == "search":
-        cache[agent_type] = SearchAgent(config)
-    elif agent_type == "chat":
-        cache[agent_type] = ChatAgent(config)
-    else:
-        raise HTTPException(status_code=400, detail=f"Unknown agent type '{agent_type}'")
+def _init_agent_runtime(app: FastAPI) -> None:
+    """Create the scheduler, MCP pool and circuit breaker shared by every agent."""
+    app.state.llm_scheduler = LLMScheduler(
+        max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "16")),
+        per_type_limits=_parse_type_limits(os.getenv("AGENT_TYPE_CONCURRENCY", "")),
+        max_queue=int(os.getenv("AGENT_MAX_QUEUE", "64")),
+        queue_timeout=float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "10")),
+    )
+    app.state.mcp_pool = MCPConnectionPool(
+        tool_ttl=float(os.getenv("MCP_TOOLS_TTL_SECONDS", "300")),
+        max_backoff=float(os.getenv("MCP_MAX_BACKOFF_SECONDS", "60")),
+    )
+    app.state.llm_breaker = CircuitBreaker(
+        failure_threshold=int(os.getenv("AGENT_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("AGENT_BREAKER_RESET_SECONDS", "30")),
+    )
+
+
+async def _create_agent(app: FastAPI, agent_type: str):
+    """Build, prepare and cache an agent once, however many requests race for it."""
+    if not hasattr(app.state, "agent_cache"):
+        app.state.agent_cache = {}
+    if not hasattr(app.state, "agent_locks"):
+        _init_agent_runtime(app)
+        app.state.agent_locks = {}
+
+    async with app.state.agent_locks.setdefault(agent_type, asyncio.Lock()):
+        if agent_type in app.state.agent_cache:
+            return app.state.agent_cache[agent_type]
+
+        agent = AGENT_TYPES[agent_type](app.state.agent_config)
+        agent.response_cache = getattr(app.state, "response_cache", None)
+        agent.scheduler = getattr(app.state, "llm_scheduler", None)
+        agent.mcp_pool = getattr(app.state, "mcp_pool", None)
+        agent.breaker = getattr(app.state, "llm_breaker", None)
+        agent.checkpointer = getattr(app.state, "agent_checkpointer", None)
+        # Coalesced executions outlive their first caller (while anyone still waits), up to the longest
+        # deadline a client may ask for
+        agent.flight_timeout = AGENT_MAX_TIMEOUT_SECONDS
+        agent.hedging = os.getenv("AGENT_HEDGING", "false").lower() in ("1", "true", "yes")
+        await agent.prepare()
+        app.state.agent_cache[agent_type] = agent
+        return agent
+
+
+async def _prewarm_agents(app: FastAPI, agent_types: List[str]) -> None:
+    """Construct agents and discover their tools before the first request."""
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_create_agent(app, agent_type) for agent_type in agent_types),
+        return_exceptions=True,
+    )
+    for agent_type, result in zip(agent_types, results):
+        if isinstance(result, Exception):
+            logger.warning("Pre-warming %s agent failed: %s", agent_type, result)
+    logger.info("Pre-warmed agents %s in %.0fms", agent_types, (time.perf_counter() - started) * 1000)
+
+
+def _parse_type_limits(spec: str) -> Dict[str, int]:
+    """Parse per-agent-type caps such as "search=4,chat=12"."""
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            agent_type, limit = part.split("=", 1)
+            limits[agent_type.strip()] = int(limit)
+    return limits
+
+
+def _open_response_cache() -> Optional[ResponseCache]:
+    """Open the on-disk agent response cache; a TTL of 0 disables it."""
+    ttl_seconds = float(os.getenv("AGENT_RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    if ttl_seconds <= 0:
+        return None
+    path = os.getenv("AGENT_RESPONSE_CACHE_PATH", str(ROOT_DIR / "agent_response_cache.sqlite3"))
+    try:
+        return ResponseCache(
+            path,
+            ttl_seconds=ttl_seconds,
+            max_entries=int(os.getenv("AGENT_RESPONSE_CACHE_MAX_ENTRIES", "5000")),
+        )
+    except Exception:
+        logger.exception("Agent response cache unavailable at %s", path)
+        return None
+
+
+async def _bcrypt_rounds_policy() -> int:
+    if os.getenv("BCRYPT_ROUNDS"):
+        return int(os.environ["BCRYPT_ROUNDS"])
+    if os.getenv("BCRYPT_TARGET_MS"):
+        target_ms = float(os.environ["BCRYPT_TARGET_MS"])
+        rounds = await asyncio.to_thread(calibrate_bcrypt_rounds, target_ms)
+        logger.info("Calibrated bcrypt work factor %s for a %sms target", rounds, target_ms)
+        return rounds
+    return BCRYPT_DEFAULT_ROUNDS
 
-    return cache[agent_type]
+
+async def _rehash_password(db, hasher: PasswordHasher, user_id: str, password: str, old_hash: str) -> None:
+    """Upgrade a stored hash to the current work factor after a successful login."""
+    try:
+        new_hash = await hasher.hash(password)
+    except HTTPException:
+        # Pool saturated; the next login will try again
+        return
+    # Only replace the hash that was verified, never a concurrently changed password
+    result = await db.users.update_one({"id": user_id, "password": old_hash}, {"$set": {"password": new_hash}})
+    if result.modified_count:
+        hasher.rehashed += 1
 
 
 @asynccontextmanager
@@ -328,16 +1706,49 @@ async def lifespan(app: FastAPI):
         raise RuntimeError(f"Missing required environment variables: {', '.join(missing)}")
 
     client = AsyncIOMotorClient(mongo_url)
+    app.state.password_hasher = PasswordHasher(
+        max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        max_queue=int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32")),
+        rounds=await _bcrypt_rounds_policy(),
+    )
+
+    app.state.token_cache = TokenCache(
+        max_entries=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000")),
+        sync_seconds=float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5")),
+    )
 
     try:
         app.state.mongo_client = client
         app.state.db = client[db_name]
+        await _provision_indexes(app.state.db)
+        app.state.item_codes_unique = await item_codes_unique(app.state.db)
+        app.state.catalog_cache = CatalogCache(
+            ttl_seconds=float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "30")),
+            max_entries=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024")),
+        )
         app.state.agent_config = AgentConfig()
         app.state.agent_cache = {}
+        app.state.response_cache = _open_response_cache()
+        app.state.agent_checkpointer = MongoCheckpointSaver(
+            app.state.db, keep_checkpoints=CHAT_SESSION_KEEP_CHECKPOINTS
+        )
+        _init_agent_runtime(app)
+        app.state.agent_locks = {}
+        prewarm = [name.strip() for name in os.getenv("AGENT_PREWARM", "").split(",") if name.strip()]
+        unknown = [name for name in prewarm if name not in AGENT_TYPES]
+        if unknown:
+            logger.warning("Ignoring unknown AGENT_PREWARM agent types: %s", unknown)
+        if prewarm:
+            await _prewarm_agents(app, [name for name in prewarm if name in AGENT_TYPES])
         logger.info("AI Agents API starting up")
         yield
     finally:
         client.close()
+        if getattr(app.state, "response_cache", None) is not None:
+            app.state.response_cache.close()
+        if getattr(app.state, "mcp_pool", None) is not None:
+            await app.state.mcp_pool.close()
+        app.state.password_hasher.shutdown()
         logger.info("AI Agents API shutdown complete")
 
 
@@ -383,7 +1794,7 @@ async def register_user(
         )
 
     # Create user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await _get_password_hasher(request).hash(user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
@@ -401,7 +1812,7 @@ async def register_user(
 
 
 @api_router.post("/auth/login", response_model=Token)
-async def login_user(login_data: UserLogin, request: Request):
+async def login_user(login_data: UserLogin, request: Request, background_tasks: BackgroundTasks):
     """Login and get JWT token."""
     db = _ensure_db(request)
 
@@ -414,12 +1825,19 @@ async def login_user(login_data: UserLogin, request: Request):
         )
 
     # Verify password
-    if not verify_password(login_data.password, user_doc["password"]):
+    hasher = _get_password_hasher(request)
+    if not await hasher.verify(login_data.password, user_doc["password"]):
         raise HTTPException(
             status_code=401,
             detail={"error": {"code": "INVALID_CREDENTIALS", "message": "Invalid email or password"}}
         )
 
+    # Bring the stored hash to the current work factor once the response is sent
+    if hasher.needs_rehash(user_doc["password"]):
+        background_tasks.add_task(
+            _rehash_password, db, hasher, user_doc["id"], login_data.password, user_doc["password"]
+        )
+
     # Create user object and token
     user = User(
         id=user_doc["id"],
@@ -433,6 +1851,30 @@ async def login_user(login_data: UserLogin, request: Request):
     return Token(user=user, token=token)
 
 
+@api_router.post("/auth/logout", status_code=204)
+async def logout_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Revoke the presented token."""
+    db = _ensure_db(request)
+    token_cache = await _synced_token_cache(request)
+    digest, payload = _verify_token(credentials.credentials, token_cache)
+    await token_cache.deny(db, digest, payload)
+    return None
+
+
+@api_router.post("/auth/revoke/{user_id}", status_code=204)
+async def revoke_user_tokens(
+    user_id: str,
+    request: Request,
+    current_user: Dict = Depends(require_role(["owner"]))
+):
+    """Revoke every token issued to a user so far, e.g. after a role change (owner only)."""
+    await _get_token_cache(request).revoke_user(_ensure_db(request), user_id)
+    return None
+
+
 @api_router.get("/auth/me", response_model=User)
 async def get_me(request: Request, current_user: Dict = Depends(get_current_user)):
     """Get current user info."""
@@ -456,7 +1898,10 @@ async def get_inventory(
     limit: int = 20,
     category: Optional[Category] = None,
     status: Optional[ItemStatus] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    sort: ListingSort = "newest",
+    cursor: Optional[str] = None,
+    count: CountMode = "exact"
 ):
     """Get inventory items (staff+)."""
     db = _ensure_db(request)
@@ -467,28 +1912,23 @@ async def get_inventory(
         query["category"] = category
     if status:
         query["status"] = status
-    if search:
-        query["$or"] = [
-            {"item_code": {"$regex": search, "$options": "i"}},
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
+    relevance = _text_search(query, search, sort)
 
     # Pagination
     limit = min(limit, 100)  # Max 100 items per page
-    skip = (page - 1) * limit
 
     # Get items
-    items_cursor = db.jewellery_items.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    items = await items_cursor.to_list(length=limit)
-    total = await db.jewellery_items.count_documents(query)
-    total_pages = (total + limit - 1) // limit
+    items, next_cursor, total = await _fetch_page(
+        db.jewellery_items, query, page, limit, cursor, relevance, count
+    )
+    total_pages = (total + limit - 1) // limit if total is not None else None
 
     return ItemsResponse(
         items=[JewelleryItem(**item) for item in items],
         page=page,
         total=total,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor
     )
 
 
@@ -501,23 +1941,105 @@ async def create_item(
     """Add new jewellery item (staff+)."""
     db = _ensure_db(request)
 
-    # Check if item_code already exists (case-insensitive)
-    existing_item = await db.jewellery_items.find_one(
-        {"item_code": {"$regex": f"^{item_data.item_code}$", "$options": "i"}}
-    )
-    if existing_item:
+    # Create item; the unique item_code_key index rejects duplicates (case-insensitive)
+    item = JewelleryItem(**item_data.model_dump())
+    item_doc = item.model_dump()
+    item_doc["item_code_key"] = _item_code_key(item.item_code)
+    await _check_item_code_free(request, db, item_doc["item_code_key"])
+    try:
+        await db.jewellery_items.insert_one(item_doc)
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=409,
             detail={"error": {"code": "DUPLICATE_ITEM_CODE", "message": "Item code already exists"}}
         )
-
-    # Create item
-    item = JewelleryItem(**item_data.model_dump())
-    await db.jewellery_items.insert_one(item.model_dump())
+    _get_catalog_cache(request).invalidate_item(item.id, item_doc)
 
     return item
 
 
+@api_router.post("/inventory/import", response_model=ImportReport)
+async def import_items(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"])),
+    import_format: Optional[ImportFormat] = Query(None, alias="format")
+):
+    """Bulk import items from a streamed CSV or NDJSON body (manager+).
+
+    CSV needs a header row of JewelleryItemCreate field names, with
+    `images` as "|"-separated URLs. Valid rows are inserted; the rest are
+    reported by line number.
+    """
+    db = _ensure_db(request)
+
+    if import_format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type in ("text/csv", "application/csv"):
+            import_format = "csv"
+        elif content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+            import_format = "ndjson"
+        else:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": {"code": "INVALID_FORMAT", "message": "Use format=csv|ndjson or a text/csv or application/x-ndjson body"}}
+            )
+
+    received = 0
+    inserted = 0
+    errors: List[ImportRowError] = []
+    seen_keys: Set[str] = set()
+    batch: List[Tuple[int, object]] = []
+    try:
+        async for row in _iter_import_rows(request, import_format):
+            received += 1
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                inserted += await _import_batch(db, batch, seen_keys, errors)
+                batch = []
+        if batch:
+            inserted += await _import_batch(db, batch, seen_keys, errors)
+    except ImportStopped as exc:
+        # Earlier batches are already committed, so report them along with where the upload broke off
+        errors.append(exc.error)
+        if batch:
+            inserted += await _import_batch(db, batch, seen_keys, errors)
+    finally:
+        if inserted:
+            _get_catalog_cache(request).clear()
+
+    errors.sort(key=lambda error: error.row)
+    return ImportReport(received=received, inserted=inserted, failed=len(errors), errors=errors)
+
+
+@api_router.get("/inventory/export")
+async def export_items(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"])),
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    category: Optional[Category] = None,
+    status: Optional[ItemStatus] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    """Stream all matching items as NDJSON or CSV (manager+).
+
+    Rows are newest first, each with a `cursor`; pass the cursor of the
+    last row received to resume an interrupted export.
+    """
+    db = _ensure_db(request)
+
+    query = {}
+    if category:
+        query["category"] = category
+    if status:
+        query["status"] = status
+    query = _export_query(query, from_date, to_date, cursor)
+
+    chunks = _stream_export(db.jewellery_items, query, JewelleryItem, export_format)
+    return _export_response(chunks, "inventory", export_format)
+
+
 @api_router.get("/inventory/{item_id}", response_model=JewelleryItem)
 async def get_item(
     item_id: str,
@@ -547,32 +2069,36 @@ async def update_item(
     """Update jewellery item (staff+)."""
     db = _ensure_db(request)
 
-    # Check if item exists
-    item = await db.jewellery_items.find_one({"id": item_id})
-    if not item:
+    # A changed item_code must stay unique; the item_code_key index enforces it
+    update_data = item_update.model_dump(exclude_unset=True)
+    if "item_code" in update_data:
+        update_data["item_code_key"] = _item_code_key(update_data["item_code"])
+        await _check_item_code_free(request, db, update_data["item_code_key"], item_id)
+
+    # Update item and get it back as written
+    update_data["updated_at"] = datetime.now(timezone.utc)
+    try:
+        updated_item = await db.jewellery_items.find_one_and_update(
+            {"id": item_id},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=409,
+            detail={"error": {"code": "DUPLICATE_ITEM_CODE", "message": "Item code already exists"}}
+        )
+    if not updated_item:
         raise HTTPException(
             status_code=404,
             detail={"error": {"code": "NOT_FOUND", "message": "Item not found"}}
         )
 
-    # If item_code is being updated, check uniqueness
-    update_data = item_update.model_dump(exclude_unset=True)
-    if "item_code" in update_data and update_data["item_code"] != item["item_code"]:
-        existing_item = await db.jewellery_items.find_one(
-            {"item_code": {"$regex": f"^{update_data['item_code']}$", "$options": "i"}}
-        )
-        if existing_item:
-            raise HTTPException(
-                status_code=409,
-                detail={"error": {"code": "DUPLICATE_ITEM_CODE", "message": "Item code already exists"}}
-            )
-
-    # Update item
-    update_data["updated_at"] = datetime.now(timezone.utc)
-    await db.jewellery_items.update_one({"id": item_id}, {"$set": update_data})
-
-    # Get updated item
-    updated_item = await db.jewellery_items.find_one({"id": item_id})
+    # The previous state isn't read back, so listings it matched are only
+    # known to be unaffected when no listing filter field changed
+    _get_catalog_cache(request).invalidate_item(
+        item_id, updated_item, all_listings=not LISTING_FILTER_FIELDS.isdisjoint(update_data)
+    )
     return JewelleryItem(**updated_item)
 
 
@@ -585,27 +2111,27 @@ async def delete_item(
     """Delete jewellery item (manager+)."""
     db = _ensure_db(request)
 
-    # Check if item exists
-    item = await db.jewellery_items.find_one({"id": item_id})
-    if not item:
-        raise HTTPException(
-            status_code=404,
-            detail={"error": {"code": "NOT_FOUND", "message": "Item not found"}}
-        )
-
     # Check if item has order history
-    order_with_item = await db.orders.find_one({"items.item_id": item_id})
+    order_with_item = await db.orders.find_one({"items.item_id": item_id}, {"_id": 1})
 
     if order_with_item:
         # Soft delete (mark as discontinued)
-        await db.jewellery_items.update_one(
+        item = await db.jewellery_items.find_one_and_update(
             {"id": item_id},
-            {"$set": {"status": "discontinued", "updated_at": datetime.now(timezone.utc)}}
+            {"$set": {"status": "discontinued", "updated_at": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.BEFORE
         )
     else:
         # Hard delete
-        await db.jewellery_items.delete_one({"id": item_id})
+        item = await db.jewellery_items.find_one_and_delete({"id": item_id})
+
+    if not item:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": {"code": "NOT_FOUND", "message": "Item not found"}}
+        )
 
+    _get_catalog_cache(request).invalidate_item(item_id, item)
     return None
 
 
@@ -620,11 +2146,30 @@ async def get_catalog(
     metal_type: Optional[MetalType] = None,
     min_price: Optional[int] = None,
     max_price: Optional[int] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    sort: ListingSort = "newest",
+    cursor: Optional[str] = None,
+    count: CountMode = "exact"
 ):
     """Get public catalog (only in_stock items)."""
     db = _ensure_db(request)
 
+    # Pagination
+    limit = min(limit, 100)
+
+    # Serve from the response cache when possible
+    cache = _get_catalog_cache(request)
+    filters = {"category": category, "metal_type": metal_type, "min_price": min_price, "max_price": max_price}
+    search_terms = (search or "").strip().lower() or None
+    cache_key = (
+        "list", category, metal_type, min_price, max_price, search_terms,
+        sort if search_terms else "newest", None if cursor else page, limit, cursor, count
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers={"X-Cache": "HIT"})
+    generation = cache.generation
+
     # Build query - only show in_stock items
     query = {"status": "in_stock"}
 
@@ -636,29 +2181,24 @@ async def get_catalog(
         query.setdefault("price", {})["$gte"] = min_price
     if max_price is not None:
         query.setdefault("price", {})["$lte"] = max_price
-    if search:
-        query["$or"] = [
-            {"item_code": {"$regex": search, "$options": "i"}},
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-
-    # Pagination
-    limit = min(limit, 100)
-    skip = (page - 1) * limit
+    relevance = _text_search(query, search, sort)
 
     # Get items
-    items_cursor = db.jewellery_items.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    items = await items_cursor.to_list(length=limit)
-    total = await db.jewellery_items.count_documents(query)
-    total_pages = (total + limit - 1) // limit
+    items, next_cursor, total = await _fetch_page(
+        db.jewellery_items, query, page, limit, cursor, relevance, count
+    )
+    total_pages = (total + limit - 1) // limit if total is not None else None
 
-    return ItemsResponse(
+    body = ItemsResponse(
         items=[JewelleryItem(**item) for item in items],
         page=page,
         total=total,
-        total_pages=total_pages
-    )
+        total_pages=total_pages,
+        next_cursor=next_cursor
+    ).model_dump_json().encode("utf-8")
+    cache.set(cache_key, body, {item["id"] for item in items}, filters, generation)
+
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
 
 
 @api_router.get("/catalog/{item_id}", response_model=JewelleryItem)
@@ -666,6 +2206,13 @@ async def get_catalog_item(item_id: str, request: Request):
     """Get single catalog item (public)."""
     db = _ensure_db(request)
 
+    cache = _get_catalog_cache(request)
+    cache_key = ("item", item_id)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json", headers={"X-Cache": "HIT"})
+    generation = cache.generation
+
     item = await db.jewellery_items.find_one({"id": item_id, "status": "in_stock"})
     if not item:
         raise HTTPException(
@@ -673,7 +2220,69 @@ async def get_catalog_item(item_id: str, request: Request):
             detail={"error": {"code": "NOT_FOUND", "message": "Item not found"}}
         )
 
-    return JewelleryItem(**item)
+    body = JewelleryItem(**item).model_dump_json().encode("utf-8")
+    cache.set(cache_key, body, {item_id}, generation=generation)
+
+    return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+
+@api_router.get("/stats/token-cache")
+async def get_token_cache_stats(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"]))
+):
+    """Get verified-token cache counters (manager+)."""
+    return _get_token_cache(request).stats()
+
+
+@api_router.get("/stats/password-hashing")
+async def get_password_hashing_stats(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"]))
+):
+    """Get password hashing pool queue depth and timings (manager+)."""
+    return _get_password_hasher(request).stats()
+
+
+@api_router.get("/stats/llm-scheduler")
+async def get_llm_scheduler_stats(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"]))
+):
+    """Get LLM concurrency, queue depth and queue wait times (manager+)."""
+    scheduler = getattr(request.app.state, "llm_scheduler", None)
+    return scheduler.stats() if scheduler else {"enabled": False}
+
+
+@api_router.get("/stats/mcp")
+async def get_mcp_stats(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"]))
+):
+    """Get MCP connection status, tool catalogues and per-tool latency histograms (manager+)."""
+    pool = getattr(request.app.state, "mcp_pool", None)
+    return pool.stats() if pool else {"enabled": False}
+
+
+@api_router.get("/stats/agents")
+async def get_agent_stats(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"]))
+):
+    """Get rolling token usage and latency per agent (manager+)."""
+    return {
+        agent_type: agent.usage_stats()
+        for agent_type, agent in _get_agent_cache(request).items()
+    }
+
+
+@api_router.get("/stats/catalog-cache")
+async def get_catalog_cache_stats(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"]))
+):
+    """Get catalog response cache counters (manager+)."""
+    return _get_catalog_cache(request).stats()
 
 
 # ===== ORDER MANAGEMENT ENDPOINTS =====
@@ -683,41 +2292,14 @@ async def create_order(order_data: OrderCreate, request: Request):
     """Place a COD order (public)."""
     db = _ensure_db(request)
 
-    # Validate items and calculate total
-    order_items = []
-    total_amount = 0
-
+    # Fetch every ordered item in one round trip
+    requested: Dict[str, int] = {}
     for item_input in order_data.items:
-        item = await db.jewellery_items.find_one({"id": item_input.item_id})
-
-        if not item:
-            raise HTTPException(
-                status_code=404,
-                detail={"error": {"code": "NOT_FOUND", "message": f"Item {item_input.item_id} not found"}}
-            )
+        requested[item_input.item_id] = requested.get(item_input.item_id, 0) + item_input.quantity
+    items_by_id = await _fetch_items_by_id(db, requested)
 
-        if item["status"] != "in_stock":
-            raise HTTPException(
-                status_code=400,
-                detail={"error": {"code": "ITEM_NOT_AVAILABLE", "message": f"Item {item['item_code']} is not available"}}
-            )
-
-        if item["quantity"] < item_input.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail={"error": {"code": "INSUFFICIENT_STOCK", "message": f"Insufficient stock for item {item['item_code']}"}}
-            )
-
-        subtotal = item["price"] * item_input.quantity
-        order_items.append(OrderItem(
-            item_id=item["id"],
-            item_code=item["item_code"],
-            name=item["name"],
-            price=item["price"],
-            quantity=item_input.quantity,
-            subtotal=subtotal
-        ))
-        total_amount += subtotal
+    # Validate items and calculate total
+    order_items, total_amount = _price_order_lines(order_data, items_by_id, requested)
 
     # Create order
     order = Order(
@@ -730,16 +2312,51 @@ async def create_order(order_data: OrderCreate, request: Request):
         shipping_address=order_data.shipping_address,
         notes=order_data.notes
     )
-
-    await db.orders.insert_one(order.model_dump())
-
-    # Update inventory quantities
-    for item_input in order_data.items:
-        await db.jewellery_items.update_one(
-            {"id": item_input.item_id},
-            {"$inc": {"quantity": -item_input.quantity}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    order_doc = order.model_dump()
+
+    # Reserve stock with conditional decrements, then record the order
+    if ORDER_TRANSACTIONS:
+        async def place(session) -> bool:
+            if not await _reserve_stock(db, requested, session):
+                await session.abort_transaction()
+                return False
+            await db.orders.insert_one(order_doc, session=session)
+            return True
+
+        # with_transaction re-runs `place` on TransientTransactionError (e.g. a
+        # WriteConflict with a concurrent checkout) and retries unknown commits
+        try:
+            async with await request.app.state.mongo_client.start_session() as session:
+                reserved = await session.with_transaction(place)
+        except PyMongoError as exc:
+            if not (exc.has_error_label("TransientTransactionError") or getattr(exc, "code", None) == 112):
+                raise
+            raise HTTPException(
+                status_code=409,
+                detail={"error": {"code": "ORDER_CONFLICT", "message": "Too many concurrent orders for these items, please retry"}}
+            ) from exc
+    else:
+        reserved = await _reserve_stock(db, requested)
+        if reserved:
+            try:
+                await db.orders.insert_one(order_doc)
+            except Exception:
+                await _release_stock(db, requested)
+                raise
+
+    if not reserved:
+        # Stock moved since validation; re-validate to report the failing line
+        _price_order_lines(order_data, await _fetch_items_by_id(db, requested), requested)
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "INSUFFICIENT_STOCK", "message": "Stock changed while placing the order, please retry"}}
         )
 
+    # Stock levels are part of the cached catalog responses
+    cache = _get_catalog_cache(request)
+    for item_id, item in items_by_id.items():
+        cache.invalidate_item(item_id, item)
+
     return order
 
 
@@ -751,7 +2368,9 @@ async def get_orders(
     limit: int = 20,
     status: Optional[OrderStatus] = None,
     from_date: Optional[str] = None,
-    to_date: Optional[str] = None
+    to_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: CountMode = "exact"
 ):
     """Get all orders (staff+)."""
     db = _ensure_db(request)
@@ -761,28 +2380,52 @@ async def get_orders(
     if status:
         query["status"] = status
     if from_date:
-        query.setdefault("created_at", {})["$gte"] = datetime.fromisoformat(from_date)
+        query.setdefault("created_at", {})["$gte"] = _parse_date(from_date, "from_date")
     if to_date:
-        query.setdefault("created_at", {})["$lte"] = datetime.fromisoformat(to_date)
+        query.setdefault("created_at", {})["$lte"] = _parse_date(to_date, "to_date")
 
     # Pagination
     limit = min(limit, 100)
-    skip = (page - 1) * limit
 
     # Get orders
-    orders_cursor = db.orders.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    orders = await orders_cursor.to_list(length=limit)
-    total = await db.orders.count_documents(query)
-    total_pages = (total + limit - 1) // limit
+    orders, next_cursor, total = await _fetch_page(db.orders, query, page, limit, cursor, count=count)
+    total_pages = (total + limit - 1) // limit if total is not None else None
 
     return OrdersResponse(
         orders=[Order(**order) for order in orders],
         page=page,
         total=total,
-        total_pages=total_pages
+        total_pages=total_pages,
+        next_cursor=next_cursor
     )
 
 
+@api_router.get("/orders/export")
+async def export_orders(
+    request: Request,
+    current_user: Dict = Depends(require_role(["manager", "owner"])),
+    export_format: ExportFormat = Query("ndjson", alias="format"),
+    status: Optional[OrderStatus] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    cursor: Optional[str] = None
+):
+    """Stream all matching orders as NDJSON or CSV (manager+).
+
+    Rows are newest first, each with a `cursor`; pass the cursor of the
+    last row received to resume an interrupted export.
+    """
+    db = _ensure_db(request)
+
+    query = {}
+    if status:
+        query["status"] = status
+    query = _export_query(query, from_date, to_date, cursor)
+
+    chunks = _stream_export(db.orders, query, Order, export_format)
+    return _export_response(chunks, "orders", export_format)
+
+
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(
     order_id: str,
@@ -812,23 +2455,22 @@ async def update_order_status(
     """Update order status (staff+)."""
     db = _ensure_db(request)
 
-    # Check if order exists
-    order = await db.orders.find_one({"id": order_id})
-    if not order:
-        raise HTTPException(
-            status_code=404,
-            detail={"error": {"code": "NOT_FOUND", "message": "Order not found"}}
-        )
-
-    # Update order
+    # Update order and get it back as written
     update_data = {"status": status_update.status, "updated_at": datetime.now(timezone.utc)}
     if status_update.notes:
         update_data["notes"] = status_update.notes
 
-    await db.orders.update_one({"id": order_id}, {"$set": update_data})
+    updated_order = await db.orders.find_one_and_update(
+        {"id": order_id},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_order:
+        raise HTTPException(
+            status_code=404,
+            detail={"error": {"code": "NOT_FOUND", "message": "Order not found"}}
+        )
 
-    # Get updated order
-    updated_order = await db.orders.find_one({"id": order_id})
     return Order(**updated_order)
 
 
@@ -851,10 +2493,19 @@ async def get_status_checks(request: Request):
 
 
 @api_router.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(chat_request: ChatRequest, request: Request):
+async def chat_with_agent(
+    chat_request: ChatRequest,
+    request: Request,
+    current_user: Optional[Dict] = Depends(get_optional_user)
+):
     try:
         agent = await _get_or_create_agent(request, chat_request.agent_type)
-        response = await agent.execute(chat_request.message)
+        response = await agent.execute(
+            chat_request.message,
+            priority=_agent_priority(current_user),
+            deadline=_request_deadline(request),
+            session_id=_session_key(chat_request.session_id, current_user)
+        )
 
         return ChatResponse(
             success=response.success,
@@ -866,6 +2517,8 @@ async def chat_with_agent(chat_request: ChatRequest, request: Request):
         )
     except HTTPException:
         raise
+    except (SchedulerRejected, CircuitOpen, DeadlineExceeded) as exc:
+        raise _agent_unavailable(exc)
     except Exception as exc:  # pragma: no cover - defensive
         logger.exception("Error in chat endpoint")
         return ChatResponse(
@@ -877,35 +2530,93 @@ async def chat_with_agent(chat_request: ChatRequest, request: Request):
         )
 
 
-@api_router.post("/search", response_model=SearchResponse)
-async def search_and_summarize(search_request: SearchRequest, request: Request):
-    try:
-        search_agent = await _get_or_create_agent(request, "search")
-        search_prompt = (
-            f"Search for information about: {search_request.query}. "
-            "Provide a comprehensive summary with key findings."
+@api_router.post("/chat/sessions", response_model=ChatSession)
+async def create_chat_session():
+    """Issue a session id for a new server-side conversation."""
+    return ChatSession(session_id=_new_session_id())
+
+
+@api_router.delete("/chat/sessions/{session_id}", status_code=204)
+async def delete_chat_session(
+    session_id: str,
+    request: Request,
+    agent_type: str = "chat",
+    current_user: Optional[Dict] = Depends(get_optional_user)
+):
+    """Forget a conversation's server-side history."""
+    if agent_type not in AGENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown agent type '{agent_type}'")
+    checkpointer = getattr(request.app.state, "agent_checkpointer", None)
+    if checkpointer is not None:
+        thread_id = AGENT_TYPES[agent_type].session_thread_id(_session_key(session_id, current_user))
+        await checkpointer.adelete_thread(thread_id)
+    return None
+
+
+@api_router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_with_agent_batch(
+    batch_request: ChatBatchRequest,
+    request: Request,
+    current_user: Dict = Depends(require_role(["staff", "manager", "owner"]))
+):
+    """Run many independent prompts in one call (staff+).
+
+    Prompts fan out with bounded concurrency in the batch priority lane;
+    results come back in input order, each with its own error. Items not
+    answered by the request deadline fail with `rejected: deadline`.
+    """
+    if len(batch_request.messages) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "BATCH_TOO_LARGE", "message": f"At most {CHAT_BATCH_MAX_ITEMS} messages per batch"}}
         )
-        result = await search_agent.execute(search_prompt, use_tools=True)
 
-        if result.success:
-            metadata = result.metadata or {}
-            return SearchResponse(
-                success=True,
-                query=search_request.query,
-                summary=result.content,
-                search_results=metadata,
-                sources_count=int(metadata.get("tool_run_count", metadata.get("tools_used", 0)) or 0),
-            )
+    agent = await _get_or_create_agent(request, batch_request.agent_type)
+    responses = await agent.execute_many(
+        batch_request.messages,
+        max_concurrency=min(batch_request.max_concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY),
+        priority=PRIORITY_BATCH,
+        deadline=_request_deadline(request),
+    )
 
-        return SearchResponse(
-            success=False,
-            query=search_request.query,
-            summary="",
-            sources_count=0,
-            error=result.error,
+    results = [
+        ChatBatchItem(
+            index=index,
+            success=response.success,
+            response=response.content,
+            metadata=response.metadata,
+            error=response.error,
+        )
+        for index, response in enumerate(responses)
+    ]
+    succeeded = sum(1 for item in results if item.success)
+    return ChatBatchResponse(
+        agent_type=batch_request.agent_type,
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        results=results,
+    )
+
+
+@api_router.post("/search", response_model=SearchResponse)
+async def search_and_summarize(
+    search_request: SearchRequest,
+    request: Request,
+    current_user: Optional[Dict] = Depends(get_optional_user)
+):
+    try:
+        search_agent = await _get_or_create_agent(request, "search")
+        result = await search_agent.execute(
+            _search_prompt(search_request.query),
+            use_tools=True,
+            priority=_agent_priority(current_user),
+            deadline=_request_deadline(request)
         )
+        return _search_response(search_request.query, result)
     except HTTPException:
         raise
+    except (SchedulerRejected, CircuitOpen, DeadlineExceeded) as exc:
+        raise _agent_unavailable(exc)
     except Exception as exc:  # pragma: no cover - defensive
         logger.exception("Error in search endpoint")
         return SearchResponse(
@@ -917,18 +2628,229 @@ async def search_and_summarize(search_request: SearchRequest, request: Request):
         )
 
 
+def _agent_priority(current_user: Optional[Dict]) -> int:
+    # Signed-in staff skip ahead of public traffic in the LLM queue
+    return PRIORITY_STAFF if current_user else PRIORITY_PUBLIC
+
+
+def _session_signature(nonce: str) -> str:
+    return hmac.new(SECRET_KEY.encode("utf-8"), f"chat-session:{nonce}".encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def _new_session_id() -> str:
+    # 32 random URL-safe characters plus their signature, 64 characters in all
+    nonce = secrets.token_urlsafe(24)
+    return nonce + _session_signature(nonce)
+
+
+def _session_key(session_id: Optional[str], current_user: Optional[Dict]) -> Optional[str]:
+    # Scope sessions to the signed-in user so one user can't continue another's conversation
+    # Anonymous callers share a namespace, so they only get unguessable server-issued ids
+    if session_id is None:
+        return None
+    if current_user:
+        return f"{current_user['id']}:{session_id}"
+    nonce, signature = session_id[:32], session_id[32:]
+    if len(session_id) != 64 or not hmac.compare_digest(signature, _session_signature(nonce)):
+        raise HTTPException(
+            status_code=400,
+            detail={"error": {"code": "INVALID_SESSION", "message": "Sign in, or use a session_id from POST /api/chat/sessions"}}
+        )
+    return f"anonymous:{session_id}"
+
+
+def _agent_unavailable(exc: Exception) -> HTTPException:
+    if isinstance(exc, DeadlineExceeded):
+        return HTTPException(
+            status_code=504,
+            detail={"error": {"code": "AGENT_TIMEOUT", "message": "Assistant did not answer within the request deadline"}}
+        )
+    if isinstance(exc, CircuitOpen):
+        return HTTPException(
+            status_code=503,
+            detail={"error": {"code": "AGENT_UNAVAILABLE", "message": "Assistant is temporarily unavailable, please retry"}},
+            headers={"Retry-After": str(exc.retry_after)}
+        )
+    return HTTPException(
+        status_code=503,
+        detail={"error": {"code": "AGENT_BUSY", "message": "Assistant is at capacity, please retry"}},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+def _request_deadline(request: Request) -> float:
+    """Deadline (time.monotonic()) from the X-Request-Timeout header in seconds, capped."""
+    timeout = AGENT_TIMEOUT_SECONDS
+    header = request.headers.get("X-Request-Timeout")
+    if header:
+        try:
+            timeout = float(header)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": {"code": "INVALID_TIMEOUT", "message": "X-Request-Timeout must be a number of seconds"}}
+            )
+        # Written this way round so NaN is rejected too
+        if not timeout > 0:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": {"code": "INVALID_TIMEOUT", "message": "X-Request-Timeout must be greater than 0"}}
+            )
+    return time.monotonic() + min(timeout, AGENT_MAX_TIMEOUT_SECONDS)
+
+
+def _search_prompt(query: str) -> str:
+    return (
+        f"Search for information about: {query}. "
+        "Provide a comprehensive summary with key findings."
+    )
+
+
+def _search_response(query: str, result: AgentResponse) -> SearchResponse:
+    if result.success:
+        metadata = result.metadata or {}
+        return SearchResponse(
+            success=True,
+            query=query,
+            summary=result.content,
+            search_results=metadata,
+            sources_count=int(metadata.get("tool_run_count", metadata.get("tools_used", 0)) or 0),
+        )
+
+    return SearchResponse(
+        success=False,
+        query=query,
+        summary="",
+        sources_count=0,
+        error=result.error,
+    )
+
+
+def _sse_frame(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _sse_response(frames: AsyncIterator[str]) -> StreamingResponse:
+    # Proxies must not buffer the stream or the client sees it all at once
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_router.post("/chat/stream")
+async def chat_with_agent_stream(
+    chat_request: ChatRequest,
+    request: Request,
+    current_user: Optional[Dict] = Depends(get_optional_user)
+):
+    """Stream a chat reply as Server-Sent Events.
+
+    Emits `token` and `tool_start`/`tool_end` events as they happen, then a
+    final `done` event shaped like ChatResponse.
+    """
+    agent = await _get_or_create_agent(request, chat_request.agent_type)
+    session_key = _session_key(chat_request.session_id, current_user)
+    deadline = _request_deadline(request)
+
+    async def frames() -> AsyncIterator[str]:
+        try:
+            events = agent.stream(
+                chat_request.message,
+                priority=_agent_priority(current_user),
+                deadline=deadline,
+                session_id=session_key,
+            )
+            async for event in events:
+                if event["event"] != "done":
+                    yield _sse_frame(event["event"], event["data"])
+                    continue
+                result = AgentResponse(**event["data"])
+                final = ChatResponse(
+                    success=result.success,
+                    response=result.content,
+                    agent_type=chat_request.agent_type,
+                    capabilities=agent.get_capabilities(),
+                    metadata=result.metadata,
+                    error=result.error,
+                )
+                yield _sse_frame("done", final.model_dump())
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.exception("Error in chat stream")
+            final = ChatResponse(
+                success=False,
+                response="",
+                agent_type=chat_request.agent_type,
+                capabilities=[],
+                error=str(exc),
+            )
+            yield _sse_frame("done", final.model_dump())
+
+    return _sse_response(frames())
+
+
+@api_router.post("/search/stream")
+async def search_and_summarize_stream(
+    search_request: SearchRequest,
+    request: Request,
+    current_user: Optional[Dict] = Depends(get_optional_user)
+):
+    """Stream a search summary as Server-Sent Events.
+
+    Emits `token` and `tool_start`/`tool_end` events as they happen, then a
+    final `done` event shaped like SearchResponse.
+    """
+    search_agent = await _get_or_create_agent(request, "search")
+    deadline = _request_deadline(request)
+
+    async def frames() -> AsyncIterator[str]:
+        try:
+            async for event in search_agent.stream(
+                _search_prompt(search_request.query),
+                use_tools=True,
+                priority=_agent_priority(current_user),
+                deadline=deadline
+            ):
+                if event["event"] != "done":
+                    yield _sse_frame(event["event"], event["data"])
+                    continue
+                final = _search_response(search_request.query, AgentResponse(**event["data"]))
+                yield _sse_frame("done", final.model_dump())
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.exception("Error in search stream")
+            final = SearchResponse(
+                success=False,
+                query=search_request.query,
+                summary="",
+                sources_count=0,
+                error=str(exc),
+            )
+            yield _sse_frame("done", final.model_dump())
+
+    return _sse_response(frames())
+
+
 @api_router.get("/agents/capabilities")
 async def get_agent_capabilities(request: Request):
     try:
         search_agent = await _get_or_create_agent(request, "search")
         chat_agent = await _get_or_create_agent(request, "chat")
 
+        breaker = getattr(request.app.state, "llm_breaker", None)
         return {
             "success": True,
             "capabilities": {
                 "search_agent": search_agent.get_capabilities(),
                 "chat_agent": chat_agent.get_capabilities(),
             },
+            "gateway": {
+                "circuit_breaker": breaker.stats() if breaker else None,
+                "hedging": {
+                    "search_agent": search_agent.hedging_stats(),
+                    "chat_agent": chat_agent.hedging_stats(),
+                },
+            },
         }
     except HTTPException:
         raise
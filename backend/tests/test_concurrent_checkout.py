@@ -0,0 +1,113 @@
+"""
+Concurrent checkout benchmark: many parallel orders for scarce stock.
+Requires server running on port 8001 and the owner account (create_owner.py).
+Run with: python -m pytest tests/test_concurrent_checkout.py -v -s
+Or as a benchmark: python tests/test_concurrent_checkout.py [parallelism]
+"""
+
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+API_BASE = "http://localhost:8001/api"
+
+STOCK = 10
+PARALLELISM = 64
+ORDERS = 200
+
+
+def _owner_headers():
+    response = requests.post(
+        f"{API_BASE}/auth/login",
+        json={"email": "owner@jewelcraft.com", "password": "OwnerPass123"}
+    )
+    if response.status_code != 200:
+        pytest.skip("Owner account needs to be created first")
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def _create_item(headers, quantity):
+    response = requests.post(
+        f"{API_BASE}/inventory",
+        json={
+            "item_code": f"FLASH-{int(time.time() * 1000)}-{quantity}",
+            "name": "Flash Sale Pendant",
+            "description": "Limited run pendant for the checkout benchmark",
+            "category": "pendant",
+            "price": 5000,
+            "weight": 2.0,
+            "metal_type": "silver",
+            "images": ["https://example.com/pendant.jpg"],
+            "quantity": quantity,
+            "status": "in_stock"
+        },
+        headers=headers
+    )
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _place_order(lines):
+    session = requests.Session()
+    return session.post(
+        f"{API_BASE}/orders",
+        json={
+            "customer_name": "Flash Buyer",
+            "customer_email": "flash@example.com",
+            "customer_phone": "5555551234",
+            "items": [{"item_id": item_id, "quantity": quantity} for item_id, quantity in lines],
+            "shipping_address": {
+                "line1": "1 Rush St",
+                "city": "Denver",
+                "state": "CO",
+                "zip": "80202",
+                "country": "USA"
+            }
+        }
+    ).status_code
+
+
+def run_flash_sale(parallelism=PARALLELISM, orders=ORDERS, stock=STOCK):
+    """Fire `orders` concurrent orders at an item with `stock` units.
+
+    Every order also takes one unit of a plentiful item, so a rejected
+    order that was not rolled back shows up as missing plentiful stock.
+    """
+    headers = _owner_headers()
+    scarce_id = _create_item(headers, stock)
+    plentiful_id = _create_item(headers, orders)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        statuses = Counter(pool.map(lambda _: _place_order([(plentiful_id, 1), (scarce_id, 1)]), range(orders)))
+    elapsed = time.perf_counter() - started
+
+    scarce = requests.get(f"{API_BASE}/inventory/{scarce_id}", headers=headers).json()["quantity"]
+    plentiful = requests.get(f"{API_BASE}/inventory/{plentiful_id}", headers=headers).json()["quantity"]
+    return statuses, scarce, plentiful, elapsed
+
+
+def test_no_oversell_under_concurrency():
+    """Exactly `STOCK` orders succeed and stock never goes negative."""
+    statuses, scarce, plentiful, elapsed = run_flash_sale()
+
+    assert statuses[201] == STOCK, f"Expected {STOCK} successful orders, got {dict(statuses)}"
+    # With ORDER_TRANSACTIONS, checkouts that keep hitting write conflicts get 409, never 500
+    assert statuses[400] + statuses[409] == ORDERS - STOCK, f"Unexpected statuses: {dict(statuses)}"
+    assert scarce == 0, f"Scarce item quantity should be 0, got {scarce}"
+    assert plentiful == ORDERS - STOCK, f"Rejected orders leaked stock: {plentiful} left"
+    print(f"✓ {ORDERS} orders x {PARALLELISM} parallel in {elapsed:.2f}s: {dict(statuses)}, 0 oversold")
+
+
+if __name__ == "__main__":
+    parallelism = int(sys.argv[1]) if len(sys.argv) > 1 else PARALLELISM
+    statuses, scarce, plentiful, elapsed = run_flash_sale(parallelism=parallelism)
+    print(f"Parallelism:     {parallelism}")
+    print(f"Orders:          {ORDERS} ({ORDERS / elapsed:.1f}/s)")
+    print(f"Statuses:        {dict(statuses)}")
+    print(f"Scarce left:     {scarce} (oversold: {max(0, statuses[201] - STOCK)})")
+    print(f"Plentiful left:  {plentiful} (expected {ORDERS - statuses[201]})")
@@ -4,6 +4,7 @@ Requires server running on port 8001.
 Run with: python -m pytest tests/test_jewellery_api.py -v
 """
 
+import json
 import os
 import sys
 import time
@@ -467,6 +468,201 @@ class TestJewelleryStoreAPI:
         assert data["role"] == "staff"
         print(f"✓ Current user info retrieved: {data['username']}")
 
+    def test_21_cursor_pagination(self):
+        """Test keyset pagination via next_cursor in catalog."""
+        first = requests.get(f"{API_BASE}/catalog?limit=1")
+        assert first.status_code == 200
+        data = first.json()
+        assert "next_cursor" in data
+        if not data["next_cursor"]:
+            pytest.skip("Need at least two catalog items to page")
+
+        second = requests.get(f"{API_BASE}/catalog", params={"limit": 1, "cursor": data["next_cursor"]})
+        assert second.status_code == 200
+        next_items = second.json()["items"]
+        assert next_items, "Expected the cursor to lead to another page"
+        assert next_items[0]["id"] != data["items"][0]["id"]
+
+        # Keyset page must match the legacy offset page
+        offset_page = requests.get(f"{API_BASE}/catalog?page=2&limit=1").json()
+        assert offset_page["items"][0]["id"] == next_items[0]["id"]
+        print(f"✓ Cursor pagination works")
+
+    def test_22_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        response = requests.get(f"{API_BASE}/catalog?cursor=not-a-cursor")
+
+        assert response.status_code == 400, f"Expected 400, got {response.status_code}"
+        assert "INVALID_CURSOR" in response.text
+        print(f"✓ Invalid cursor rejected")
+
+    def test_23_search_relevance(self):
+        """Test relevance-ranked full-text search in catalog."""
+        if not TestJewelleryStoreAPI.item_id:
+            self.test_04_add_inventory_item()
+
+        response = requests.get(f"{API_BASE}/catalog?search=diamond&sort=relevance&category=ring")
+
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        data = response.json()
+        assert data["items"], "Expected the diamond ring to match"
+        for item in data["items"]:
+            assert item["category"] == "ring"
+        print(f"✓ Relevance search works: {len(data['items'])} items found")
+
+        # Relevance order has no keyset cursor
+        response = requests.get(f"{API_BASE}/catalog?search=diamond&sort=relevance&cursor=abc")
+        assert response.status_code == 400
+
+    def test_24_count_modes(self):
+        """Test count=exact|estimated|none on listings."""
+        exact = requests.get(f"{API_BASE}/catalog?limit=5&count=exact").json()
+        estimated = requests.get(f"{API_BASE}/catalog?limit=5&count=estimated").json()
+        none = requests.get(f"{API_BASE}/catalog?limit=5&count=none").json()
+
+        assert isinstance(exact["total"], int)
+        assert estimated["total"] <= exact["total"]
+        assert none["total"] is None and none["total_pages"] is None
+        assert [i["id"] for i in none["items"]] == [i["id"] for i in exact["items"]]
+        print(f"✓ Count modes work: exact={exact['total']}, estimated={estimated['total']}")
+
+    def test_25_catalog_cache_invalidation(self):
+        """Test that catalog responses are cached and invalidated by orders."""
+        if not TestJewelleryStoreAPI.item_id:
+            self.test_04_add_inventory_item()
+        item_url = f"{API_BASE}/catalog/{TestJewelleryStoreAPI.item_id}"
+
+        requests.get(item_url)
+        cached = requests.get(item_url)
+        assert cached.headers.get("X-Cache") == "HIT"
+        initial_qty = cached.json()["quantity"]
+
+        order_response = requests.post(
+            f"{API_BASE}/orders",
+            json={
+                "customer_name": "Cache Test",
+                "customer_email": "cache@example.com",
+                "customer_phone": "5555550000",
+                "items": [{"item_id": TestJewelleryStoreAPI.item_id, "quantity": 1}],
+                "shipping_address": {
+                    "line1": "1 Cache Rd",
+                    "city": "Austin",
+                    "state": "TX",
+                    "zip": "73301",
+                    "country": "USA"
+                }
+            }
+        )
+        assert order_response.status_code == 201
+
+        fresh = requests.get(item_url)
+        assert fresh.headers.get("X-Cache") == "MISS"
+        assert fresh.json()["quantity"] == initial_qty - 1
+        print(f"✓ Catalog cache invalidated by order: {initial_qty} → {initial_qty - 1}")
+
+    def test_26_bulk_import_csv(self):
+        """Test bulk CSV import with a per-row error report (manager+)."""
+        if not TestJewelleryStoreAPI.owner_token:
+            self.test_02_register_staff_user()
+
+        prefix = f"IMP-{int(time.time() * 1000)}"
+        header = "item_code,name,description,category,price,weight,metal_type,stones,images,quantity,status"
+        rows = [
+            f"{prefix}-1,Gold Chain,Rope chain,chain,45000,8.2,gold,,https://example.com/c1.jpg|https://example.com/c2.jpg,4,in_stock",
+            f"{prefix}-1,Gold Chain,Same code again,chain,45000,8.2,gold,,https://example.com/c1.jpg,4,in_stock",
+            f"{prefix}-2,Silver Bangle,Bad price,bangle,not-a-price,12.0,silver,,https://example.com/b.jpg,2,in_stock",
+        ]
+        response = requests.post(
+            f"{API_BASE}/inventory/import",
+            data="\n".join([header] + rows).encode("utf-8"),
+            headers={
+                "Authorization": f"Bearer {TestJewelleryStoreAPI.owner_token}",
+                "Content-Type": "text/csv"
+            }
+        )
+
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        report = response.json()
+        assert report["received"] == 3
+        assert report["inserted"] == 1
+        assert [(e["row"], e["code"]) for e in report["errors"]] == [(3, "DUPLICATE_ITEM_CODE"), (4, "VALIDATION_ERROR")]
+        print(f"✓ Bulk import: {report['inserted']} inserted, {report['failed']} rejected")
+
+        # Staff cannot bulk import
+        if TestJewelleryStoreAPI.staff_token:
+            response = requests.post(
+                f"{API_BASE}/inventory/import?format=csv",
+                data=header.encode("utf-8"),
+                headers={"Authorization": f"Bearer {TestJewelleryStoreAPI.staff_token}"}
+            )
+            assert response.status_code == 403
+
+    def test_27_export_orders_resumable(self):
+        """Test streaming NDJSON order export and resuming from a row cursor (manager+)."""
+        if not TestJewelleryStoreAPI.owner_token:
+            self.test_02_register_staff_user()
+        headers = {"Authorization": f"Bearer {TestJewelleryStoreAPI.owner_token}"}
+
+        response = requests.get(f"{API_BASE}/orders/export?format=ndjson", headers=headers, stream=True)
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}"
+        assert response.headers["Content-Type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.iter_lines() if line]
+        if len(rows) < 2:
+            pytest.skip("Need at least two orders to test resuming")
+
+        resumed = requests.get(f"{API_BASE}/orders/export", params={"cursor": rows[0]["cursor"]}, headers=headers)
+        resumed_rows = [json.loads(line) for line in resumed.text.splitlines() if line]
+        assert [row["id"] for row in resumed_rows] == [row["id"] for row in rows[1:]]
+        print(f"✓ Order export streamed {len(rows)} rows and resumed after the first")
+
+    def test_28_logout_revokes_token(self):
+        """Test that a logged-out token is rejected even though it is still cached."""
+        if not TestJewelleryStoreAPI.staff_token:
+            self.test_02_register_staff_user()
+
+        login = requests.post(
+            f"{API_BASE}/auth/login",
+            json={"email": TestJewelleryStoreAPI.staff_email, "password": "StaffPass123"}
+        )
+        assert login.status_code == 200
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+        # Warm the verified-token cache, then log out
+        assert requests.get(f"{API_BASE}/auth/me", headers=headers).status_code == 200
+        assert requests.post(f"{API_BASE}/auth/logout", headers=headers).status_code == 204
+
+        response = requests.get(f"{API_BASE}/auth/me", headers=headers)
+        assert response.status_code == 401
+        assert "Token revoked" in response.text
+
+        # Other sessions of the same user are unaffected
+        other = requests.get(
+            f"{API_BASE}/auth/me",
+            headers={"Authorization": f"Bearer {TestJewelleryStoreAPI.staff_token}"}
+        )
+        assert other.status_code == 200
+        print(f"✓ Logout revoked only the logged-out token")
+
+    def test_29_search_item_code(self):
+        """Test that partial and hyphenated item codes match only by code (staff+)."""
+        if not TestJewelleryStoreAPI.item_id:
+            self.test_04_add_inventory_item()
+        headers = {"Authorization": f"Bearer {TestJewelleryStoreAPI.staff_token}"}
+        item_code = requests.get(
+            f"{API_BASE}/inventory/{TestJewelleryStoreAPI.item_id}", headers=headers
+        ).json()["item_code"]
+
+        # A prefix of the code, in another case, still finds the item
+        response = requests.get(f"{API_BASE}/inventory", params={"search": item_code[:-3].lower()}, headers=headers)
+        assert response.status_code == 200
+        assert TestJewelleryStoreAPI.item_id in [item["id"] for item in response.json()["items"]]
+
+        # The full hyphenated code is not split into "jwl" and the number
+        response = requests.get(f"{API_BASE}/inventory", params={"search": item_code}, headers=headers)
+        assert response.status_code == 200
+        assert [item["item_code"] for item in response.json()["items"]] == [item_code]
+        print(f"✓ Item code search matches by prefix and exact code")
+
 
 if __name__ == "__main__":
     print("\n" + "="*60)
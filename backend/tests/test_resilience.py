@@ -0,0 +1,247 @@
+"""Unit tests for the circuit breaker, deadlines and coalesced executions (no services needed)."""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Ensure backend package is on sys.path when invoked from repo root
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ai_agents import AgentConfig, ChatAgent
+from ai_agents.agents import AgentResponse
+from ai_agents.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, remaining
+from ai_agents.scheduler import LLMScheduler
+
+
+def _agent(answer_after: float = 0.0) -> ChatAgent:
+    agent = ChatAgent(AgentConfig(api_key="test-key"))
+    calls = []
+
+    async def execute(prompt, use_tools, session_id=None):
+        calls.append(prompt)
+        await asyncio.sleep(answer_after)
+        return AgentResponse(success=True, content=f"answer to {prompt}")
+
+    async def stream(prompt, use_tools, session_id=None):
+        calls.append(prompt)
+        for word in prompt.split():
+            await asyncio.sleep(answer_after)
+            yield {"event": "token", "data": {"content": word}}
+        yield {"event": "done", "data": AgentResponse(success=True, content=prompt).model_dump()}
+
+    agent._execute = execute
+    agent._stream = stream
+    agent.calls = calls
+    return agent
+
+
+def test_breaker_opens_after_threshold_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    probe = breaker.before_call()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record(True, probe)
+    assert breaker.state == "closed"
+    assert breaker.stats()["times_opened"] == 1
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record(False)
+    probe = breaker.before_call()
+    assert breaker.state == "half_open"
+    breaker.record(False, probe)
+    assert breaker.state == "open"
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_skipped_probe_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record(False)
+    probe = breaker.before_call()
+    breaker.record_skipped(probe)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+
+
+def test_late_outcomes_do_not_move_an_open_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    # Two calls start while closed; the first failure opens the circuit
+    assert breaker.before_call() is None
+    assert breaker.before_call() is None
+    breaker.record(False)
+    opened_at = breaker._opened_at
+
+    # The other call finishing late neither closes the circuit nor restarts its reset timeout
+    breaker.record(True)
+    assert breaker.state == "open"
+    breaker.record(False)
+    assert breaker._opened_at == opened_at
+    assert breaker.stats()["stale_outcomes"] == 2
+
+
+def test_only_the_probe_settles_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record(False)
+    probe = breaker.before_call()
+
+    # Results and skips of calls started before the probe don't settle it or free its slot
+    breaker.record(True)
+    breaker.record(False)
+    breaker.record_skipped()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.record(True, probe)
+    assert breaker.state == "closed"
+    # A probe's token is spent once its outcome is in
+    breaker.record_skipped(probe)
+    assert breaker.state == "closed"
+
+
+def test_remaining_raises_once_deadline_passed():
+    assert remaining(None) is None
+    assert 0 < remaining(time.monotonic() + 10) <= 10
+    with pytest.raises(DeadlineExceeded):
+        remaining(time.monotonic() - 0.001)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("with_scheduler", [False, True])
+async def test_expired_deadline_does_not_hold_half_open_probe(with_scheduler):
+    agent = _agent()
+    agent.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    agent.scheduler = LLMScheduler() if with_scheduler else None
+    agent.breaker.record(False)
+
+    with pytest.raises(DeadlineExceeded):
+        await agent.execute("hello", use_tools=False, deadline=time.monotonic() - 1)
+
+    # The next caller still gets the probe, and its success closes the circuit
+    response = await agent.execute("hello", use_tools=False, deadline=time.monotonic() + 5)
+    assert response.success
+    assert agent.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_deadline_expiring_in_queue_frees_probe():
+    agent = _agent()
+    agent.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    agent.scheduler = LLMScheduler(max_concurrency=1)
+    agent.flight_timeout = 0.05
+    agent.breaker.record(False)
+
+    # The only slot is taken, so the probe runs out of time in the queue
+    release = asyncio.Event()
+
+    async def hold():
+        async with agent.scheduler.slot("other"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    with pytest.raises(DeadlineExceeded):
+        await agent.execute("queued", use_tools=False)
+    assert agent.breaker.state == "half_open"
+    assert not agent.breaker._probe_in_flight
+
+    release.set()
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_flight_timeout_counts_as_failure():
+    agent = _agent(answer_after=1.0)
+    agent.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+    agent.flight_timeout = 0.05
+    with pytest.raises(DeadlineExceeded):
+        await agent.execute("slow", use_tools=False)
+    assert agent.breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_follower_outlives_leader_deadline():
+    agent = _agent(answer_after=0.2)
+    agent.flight_timeout = 5.0
+    now = time.monotonic()
+
+    leader, follower = await asyncio.gather(
+        agent.execute("same question", use_tools=False, deadline=now + 0.05),
+        agent.execute("same  question", use_tools=False, deadline=now + 2),
+        return_exceptions=True
+    )
+
+    assert isinstance(leader, DeadlineExceeded)
+    assert follower.success
+    assert follower.metadata["coalescing"]["shared"] is True
+    assert agent.calls == ["same question"]
+
+
+@pytest.mark.asyncio
+async def test_flight_is_cancelled_when_its_last_caller_gives_up():
+    agent = _agent(answer_after=5.0)
+    agent.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    agent.breaker.record(False)
+    agent.flight_timeout = 30.0
+
+    with pytest.raises(DeadlineExceeded):
+        await agent.execute("slow", use_tools=False, deadline=time.monotonic() + 0.05)
+    await asyncio.sleep(0.01)
+
+    # The upstream call stopped, released the half-open probe and didn't count as a failure
+    assert agent.coalescing_stats()["in_flight"] == 0
+    assert agent.breaker.state == "half_open"
+    assert not agent.breaker._probe_in_flight
+
+    # An identical request afterwards starts its own execution
+    agent._execute = _agent()._execute
+    response = await agent.execute("slow", use_tools=False, deadline=time.monotonic() + 5)
+    assert response.metadata["coalescing"]["shared"] is False
+    assert agent.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_stream_cut_off_at_deadline_ends_with_failed_done():
+    agent = _agent(answer_after=0.2)
+    agent.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+
+    events = [event async for event in agent.stream("one two three", use_tools=False, deadline=time.monotonic() + 0.3)]
+
+    assert [event["event"] for event in events] == ["token", "done"]
+    assert events[-1]["data"]["success"] is False
+    assert events[-1]["data"]["metadata"] == {"rejected": "deadline"}
+    assert agent.breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_expired_stream_and_batch_items_are_rejected_without_calling_upstream():
+    agent = _agent()
+    agent.scheduler = LLMScheduler()
+    deadline = time.monotonic() - 1
+
+    events = [event async for event in agent.stream("hello", use_tools=False, deadline=deadline)]
+    responses = await agent.execute_many(["a", "b"], use_tools=False, deadline=deadline)
+
+    assert [event["event"] for event in events] == ["done"]
+    assert events[0]["data"]["metadata"] == {"rejected": "deadline"}
+    assert [response.metadata for response in responses] == [{"rejected": "deadline"}] * 2
+    assert agent.calls == []
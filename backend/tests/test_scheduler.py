@@ -0,0 +1,98 @@
+"""Unit tests for the LLM scheduler's priority order and rejections (no services needed)."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure backend package is on sys.path when invoked from repo root
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ai_agents.scheduler import PRIORITY_BATCH, PRIORITY_STAFF, LLMScheduler, SchedulerRejected
+
+
+async def _hold(scheduler, release: asyncio.Event, agent_type: str = "chat"):
+    async with scheduler.slot(agent_type):
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_full():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+    running = asyncio.create_task(_hold(scheduler, release))
+    queued = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerRejected) as exc_info:
+        async with scheduler.slot("chat"):
+            pass
+    assert exc_info.value.reason == "queue_full"
+
+    release.set()
+    await asyncio.gather(running, queued)
+    stats = scheduler.stats()
+    assert stats["rejected"] == 1
+    assert stats["granted"] == 2
+    assert stats["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rejects_after_queue_timeout():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout=5.0)
+    release = asyncio.Event()
+    running = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+
+    # A shorter per-request timeout (what is left of a deadline) wins over the queue timeout
+    with pytest.raises(SchedulerRejected) as exc_info:
+        async with scheduler.slot("chat", timeout=0.05):
+            pass
+    assert exc_info.value.reason == "queue_timeout"
+    assert scheduler.stats()["queued"] == 0
+
+    release.set()
+    await running
+    assert scheduler.stats()["timed_out"] == 1
+
+
+@pytest.mark.asyncio
+async def test_better_priority_runs_first():
+    scheduler = LLMScheduler(max_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    async def run(name, priority):
+        async with scheduler.slot("chat", priority):
+            order.append(name)
+
+    running = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+    batch = asyncio.create_task(run("batch", PRIORITY_BATCH))
+    await asyncio.sleep(0)
+    staff = asyncio.create_task(run("staff", PRIORITY_STAFF))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(running, batch, staff)
+    assert order == ["staff", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_type_at_its_cap_does_not_block_other_types():
+    scheduler = LLMScheduler(max_concurrency=2, per_type_limits={"image": 1})
+    release = asyncio.Event()
+    image = asyncio.create_task(_hold(scheduler, release, "image"))
+    await asyncio.sleep(0)
+    waiting_image = asyncio.create_task(_hold(scheduler, release, "image"))
+    await asyncio.sleep(0)
+
+    async with scheduler.slot("chat", timeout=0.5) as queue_ms:
+        assert scheduler.stats()["running_by_type"] == {"image": 1, "chat": 1}
+    assert queue_ms < 500
+
+    release.set()
+    await asyncio.gather(image, waiting_image)
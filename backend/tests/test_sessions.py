@@ -0,0 +1,201 @@
+"""Unit tests for chat sessions: the Mongo checkpointer and history compaction (no services needed)."""
+
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from mongomock_motor import AsyncMongoMockClient
+from pydantic import Field
+
+# Ensure backend package is on sys.path when invoked from repo root
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ai_agents import AgentConfig, ChatAgent, MongoCheckpointSaver
+from ai_agents.agents import SUMMARY_MESSAGE_ID
+
+
+class SummaryModel(BaseChatModel):
+    # Answers every call with a fixed summary and remembers what it was asked
+    calls: List[list] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "summary-stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="SUMMARY"))])
+
+
+def _config(thread_id: str, checkpoint_id: str = None):
+    configurable = {"thread_id": thread_id, "checkpoint_ns": ""}
+    if checkpoint_id:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+
+async def _put(saver, thread_id: str, parent_id: str = None, step: int = 0):
+    checkpoint = create_checkpoint(empty_checkpoint(), None, step)
+    return await saver.aput(_config(thread_id, parent_id), checkpoint, {"source": "loop", "step": step}, {})
+
+
+@pytest.fixture
+def saver():
+    db = AsyncMongoMockClient()["sessions_test"]
+    return MongoCheckpointSaver(db, keep_checkpoints=3)
+
+
+@pytest.fixture
+def agent():
+    agent = ChatAgent(AgentConfig(api_key="test-key", history_token_budget=200))
+    agent.llm = SummaryModel()
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_put_and_get_latest_checkpoint(saver):
+    first = await _put(saver, "t1", step=0)
+    second = await _put(saver, "t1", first["configurable"]["checkpoint_id"], step=1)
+
+    latest = await saver.aget_tuple(_config("t1"))
+    assert latest.config["configurable"]["checkpoint_id"] == second["configurable"]["checkpoint_id"]
+    assert latest.parent_config["configurable"]["checkpoint_id"] == first["configurable"]["checkpoint_id"]
+    assert latest.metadata["step"] == 1
+
+    exact = await saver.aget_tuple(first)
+    assert exact.metadata["step"] == 0
+    assert exact.parent_config is None
+    assert await saver.aget_tuple(_config("other")) is None
+
+
+@pytest.mark.asyncio
+async def test_list_filters_and_limits(saver):
+    config = None
+    for step in range(3):
+        config = await _put(saver, "t1", config and config["configurable"]["checkpoint_id"], step)
+
+    steps = [item.metadata["step"] async for item in saver.alist(_config("t1"))]
+    assert steps == [2, 1, 0]
+    assert [item.metadata["step"] async for item in saver.alist(_config("t1"), limit=1)] == [2]
+    assert [item.metadata["step"] async for item in saver.alist(_config("t1"), before=config)] == [1, 0]
+    assert [item.metadata["step"] async for item in saver.alist(_config("t1"), filter={"step": 1})] == [1]
+
+
+@pytest.mark.asyncio
+async def test_pending_writes_are_returned_in_order(saver):
+    config = await _put(saver, "t1")
+    await saver.aput_writes(config, [("messages", "b"), ("other", "c")], task_id="task-2")
+    await saver.aput_writes(config, [("messages", "a")], task_id="task-1")
+    # Regular writes keep their first value when a task is replayed
+    await saver.aput_writes(config, [("messages", "changed")], task_id="task-1")
+
+    latest = await saver.aget_tuple(config)
+    assert latest.pending_writes == [
+        ("task-1", "messages", "a"),
+        ("task-2", "messages", "b"),
+        ("task-2", "other", "c"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_prune_keeps_newest_checkpoints_and_their_writes(saver):
+    configs = []
+    parent = None
+    for step in range(5):
+        config = await _put(saver, "t1", parent, step)
+        await saver.aput_writes(config, [("messages", step)], task_id="task")
+        configs.append(config)
+        parent = config["configurable"]["checkpoint_id"]
+    await _put(saver, "t2")
+
+    steps = [item.metadata["step"] async for item in saver.alist(_config("t1"))]
+    assert steps == [4, 3, 2]
+    assert await saver.aget_tuple(configs[0]) is None
+    kept_ids = {config["configurable"]["checkpoint_id"] for config in configs[2:]}
+    assert {write["checkpoint_id"] async for write in saver.writes.find({"thread_id": "t1"})} == kept_ids
+    # Other threads are untouched
+    assert await saver.aget_tuple(_config("t2")) is not None
+
+
+@pytest.mark.asyncio
+async def test_delete_thread(saver):
+    config = await _put(saver, "t1")
+    await saver.aput_writes(config, [("messages", "a")], task_id="task")
+    await _put(saver, "t2")
+
+    await saver.adelete_thread("t1")
+    assert await saver.aget_tuple(_config("t1")) is None
+    assert await saver.writes.count_documents({}) == 0
+    assert await saver.aget_tuple(_config("t2")) is not None
+
+
+@pytest.mark.asyncio
+async def test_history_under_budget_is_left_alone(agent):
+    messages = [HumanMessage(content="hi", id="1"), AIMessage(content="hello", id="2"), HumanMessage(content="ring?", id="3")]
+    update = await agent._compact_history({"messages": messages})
+
+    assert "messages" not in update
+    assert update["llm_input_messages"][0].content == agent.system_prompt
+    assert update["llm_input_messages"][1:] == messages
+    assert agent.llm.calls == []
+
+
+@pytest.mark.asyncio
+async def test_compaction_cuts_at_oldest_turn_that_fits_half_the_budget(agent):
+    long_answer = "x" * 400
+    messages = [
+        HumanMessage(content="old one", id="1"), AIMessage(content=long_answer, id="2"),
+        HumanMessage(content="old two", id="3"), AIMessage(content=long_answer, id="4"),
+        HumanMessage(content="recent", id="5"), AIMessage(content="short", id="6"),
+        HumanMessage(content="now", id="7"),
+    ]
+    update = await agent._compact_history({"messages": messages})
+
+    summary, *kept = update["messages"][1:]
+    assert summary.id == SUMMARY_MESSAGE_ID
+    assert summary.content == "SUMMARY"
+    assert [message.id for message in kept] == ["5", "6", "7"]
+    assert "old two" in agent.llm.calls[0][1].content
+    assert "recent" not in agent.llm.calls[0][1].content
+    assert update["llm_input_messages"][0].content.endswith("SUMMARY")
+    assert update["llm_input_messages"][1:] == kept
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_an_oversized_current_turn(agent):
+    messages = [
+        SystemMessage(content="earlier", id=SUMMARY_MESSAGE_ID),
+        HumanMessage(content="old", id="1"), AIMessage(content="answer", id="2"),
+        HumanMessage(content="y" * 1200, id="3"),
+    ]
+    update = await agent._compact_history({"messages": messages})
+
+    # Folds everything before the current turn, together with the earlier summary
+    assert [message.id for message in update["messages"][2:]] == ["3"]
+    assert "Earlier summary:\nearlier" in agent.llm.calls[0][1].content
+
+
+@pytest.mark.asyncio
+async def test_interrupted_tool_calls_get_placeholder_results(agent):
+    messages = [
+        HumanMessage(content="search", id="1"),
+        AIMessage(content="", id="2", tool_calls=[
+            {"id": "call-1", "name": "search", "args": {}},
+            {"id": "call-2", "name": "search", "args": {}},
+        ]),
+        ToolMessage(content="found", tool_call_id="call-1", id="3"),
+        HumanMessage(content="again", id="4"),
+    ]
+    update = await agent._compact_history({"messages": messages})
+
+    repaired = update["messages"][1:]
+    assert [getattr(message, "tool_call_id", None) for message in repaired] == [None, None, "call-1", "call-2", None]
+    assert isinstance(repaired[3], ToolMessage)
+    assert update["llm_input_messages"][1:] == repaired